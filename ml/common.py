@@ -178,8 +178,63 @@ def set_seed(seed: int) -> None:
         torch.cuda.manual_seed_all(seed)
 
 
-def create_loader(dataset: Dataset, batch_size: int, num_workers: int, shuffle: bool) -> DataLoader:
-    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers, pin_memory=torch.cuda.is_available())
+def resolve_num_workers(value: object) -> int:
+    if value is None or str(value).strip().lower() == "auto":
+        # Half the cores, clamped: more workers than that oversubscribes small CPUs.
+        return min(8, max(2, (os.cpu_count() or 2) // 2))
+    return max(0, int(value))
+
+
+def create_loader(
+    dataset: Dataset,
+    batch_size: int,
+    num_workers: int,
+    shuffle: bool,
+    prefetch_factor: int = 4,
+    drop_last: bool = False,
+) -> DataLoader:
+    use_workers = num_workers > 0
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=use_workers,
+        prefetch_factor=max(1, prefetch_factor) if use_workers else None,
+        drop_last=drop_last,
+    )
+
+
+def get_autocast_dtype(precision: str, device: torch.device) -> torch.dtype | None:
+    name = precision.strip().lower()
+    if name in {"", "fp32", "float32", "none"}:
+        return None
+    if name not in {"bf16", "bfloat16", "fp16", "float16"}:
+        raise ValueError(f"Unsupported training.precision '{precision}'. Use 'fp32', 'bf16' or 'fp16'.")
+    if device.type != "cuda":
+        # Mixed precision only pays off on CUDA tensor cores; CPU training stays in FP32.
+        return None
+    if name in {"bf16", "bfloat16"} and torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    return torch.float16
+
+
+def compile_model(model: nn.Module, enabled: bool, device: torch.device, mode: str = "max-autotune") -> nn.Module:
+    if not enabled:
+        return model
+    if device.type != "cuda":
+        # Inductor on CPU needs a C++ toolchain and gains little for these small models.
+        print("compile_model is only used for CUDA training. Training in eager mode.")
+        return model
+    try:
+        # Compilation is lazy and runs on the first forward pass; make graphs that fail to compile
+        # then run eagerly instead of aborting training.
+        torch._dynamo.config.suppress_errors = True
+        return torch.compile(model, mode=mode)
+    except Exception as exc:
+        print(f"torch.compile is unavailable ({exc}). Training in eager mode.")
+        return model
 
 
 def evaluate_model(model: nn.Module, loader: DataLoader, device: torch.device, criterion: nn.Module) -> Dict[str, float]:
@@ -189,8 +244,8 @@ def evaluate_model(model: nn.Module, loader: DataLoader, device: torch.device, c
     y_pred: List[int] = []
     with torch.no_grad():
         for images, labels in loader:
-            images = images.to(device)
-            labels = labels.to(device)
+            images = images.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
             logits = model(images)
             loss = criterion(logits, labels)
             losses.append(float(loss.item()))
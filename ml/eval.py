@@ -26,6 +26,7 @@ try:
         read_dataset_paths,
         read_labels_dataframe,
         read_split_file,
+        resolve_num_workers,
         save_json,
     )
 except ModuleNotFoundError as exc:
@@ -109,7 +110,7 @@ def main() -> None:
     output_dir = Path(str(training_cfg.get("output_dir", "ml/artifacts"))).resolve()
     image_size = int(training_cfg.get("image_size", 224))
     batch_size = int(training_cfg.get("batch_size", 32))
-    num_workers = int(training_cfg.get("num_workers", 2))
+    num_workers = resolve_num_workers(training_cfg.get("num_workers", "auto"))
     paths = read_dataset_paths(config)
 
     eval_dataset = CsvImageDataset(
@@ -2,22 +2,33 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
+import inspect
 import json
+import os
 import random
+import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
 
 try:
+    import numpy as np
     import pandas as pd
 except ModuleNotFoundError as exc:
     print(f"Missing Python package '{exc.name}'. Install dependencies with: pip install -r ml/requirements.txt")
     raise SystemExit(1) from exc
 
+try:
+    import orjson
+except ModuleNotFoundError:  # Optional: stdlib json is used as a fallback.
+    orjson = None
+
 from common import load_config, read_dataset_paths, set_seed
 
 
 DEFAULT_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+METADATA_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
 
 
 @dataclass(frozen=True)
@@ -75,6 +86,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Disable class-stratified splitting and use simple random split.",
     )
+    parser.add_argument(
+        "--keep-duplicate-images",
+        action="store_true",
+        help="Split byte-identical images separately (default: only one copy per image goes into the splits).",
+    )
     parser.add_argument(
         "--auto-apply-suggestions",
         action="store_true",
@@ -99,6 +115,21 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def _scan_images(directory: str, result: list[Path]) -> None:
+    # Visiting entries in name order yields globally sorted paths, so no final sort is needed.
+    try:
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda entry: os.path.normcase(entry.name))
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        # Like Path.rglob, skip directories that cannot be listed (or vanished) instead of aborting the scan.
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            _scan_images(entry.path, result)
+        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in DEFAULT_IMAGE_EXTENSIONS:
+            result.append(Path(entry.path))
+
+
 def find_images(raw_root: Path) -> list[Path]:
     if not raw_root.exists():
         raise FileNotFoundError(
@@ -106,15 +137,55 @@ def find_images(raw_root: Path) -> list[Path]:
             "Expected structure: <dataset-root>/raw/<student-id>/<timestamp>.jpg"
         )
 
-    result = [
-        path
-        for path in raw_root.rglob("*")
-        if path.is_file() and path.suffix.lower() in DEFAULT_IMAGE_EXTENSIONS
-    ]
-    result.sort()
+    result: list[Path] = []
+    _scan_images(str(raw_root), result)
     return result
 
 
+def _hash_file(path: Path) -> str:
+    with path.open("rb") as file:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(file, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def hash_images(images: list[Path]) -> list[str]:
+    # Threads rather than processes: hashlib releases the GIL while digesting, and spawned workers
+    # on Windows would re-import this script (and torch through common) once each.
+    with ThreadPoolExecutor(max_workers=METADATA_READ_WORKERS) as executor:
+        return list(executor.map(_hash_file, images, chunksize=16))
+
+
+def find_duplicate_rows(
+    labels_df: pd.DataFrame,
+    digest_by_image: dict[str, str],
+    image_column: str,
+    label_column: str,
+) -> tuple[set[str], list[list[tuple[str, str]]]]:
+    images = labels_df[image_column].astype(str).to_numpy()
+    labels = labels_df[label_column].astype(str).str.strip().to_numpy()
+    groups: dict[str, list[tuple[str, str]]] = {}
+    for image_rel, label in zip(images, labels):
+        digest = digest_by_image.get(image_rel)
+        if digest is not None:
+            groups.setdefault(digest, []).append((image_rel, label))
+
+    duplicates: set[str] = set()
+    conflicts: list[list[tuple[str, str]]] = []
+    for rows in groups.values():
+        if len(rows) < 2:
+            continue
+        # A labelled copy wins over unlabelled twins, so a manual label always reaches the splits.
+        keep = next((image_rel for image_rel, label in rows if label), rows[0][0])
+        duplicates.update(image_rel for image_rel, _ in rows if image_rel != keep)
+        if len({label for _, label in rows if label}) > 1:
+            conflicts.append(rows)
+    return duplicates, conflicts
+
+
 def normalize_relative(path: Path, root: Path) -> str:
     return str(path.relative_to(root)).replace("\\", "/")
 
@@ -154,13 +225,14 @@ def upsert_labels(
     existing[notes_column] = existing[notes_column].astype(str)
 
     existing_by_image = {
-        row[image_column]: (
-            row[label_column],
-            row[source_column],
-            row[notes_column],
+        image_path: (label, source, notes)
+        for image_path, label, source, notes in zip(
+            existing[image_column].to_numpy(),
+            existing[label_column].to_numpy(),
+            existing[source_column].to_numpy(),
+            existing[notes_column].to_numpy(),
         )
-        for _, row in existing.iterrows()
-        if str(row[image_column]).strip()
+        if image_path.strip()
     }
 
     rows: list[tuple[str, str, str, str]] = []
@@ -183,68 +255,125 @@ def upsert_labels(
     return merged
 
 
-def metadata_path_for_image(dataset_root: Path, image_rel: str) -> Path:
-    image_path = dataset_root / image_rel
-    return image_path.with_suffix(".json")
+def metadata_rel_for_image(image_rel: str) -> str:
+    # String equivalent of Path.with_suffix(".json") for "/"-normalized relative paths.
+    name_start = image_rel.rfind("/") + 1
+    dot = image_rel.rfind(".")
+    if dot > name_start:
+        return f"{image_rel[:dot]}.json"
+    return f"{image_rel}.json"
 
 
-def class_from_metadata(metadata: dict) -> tuple[str | None, str, float]:
-    text_parts = [
-        str(metadata.get("activeWindowTitle") or ""),
-        str(metadata.get("activeProcessName") or ""),
-        str(metadata.get("browserHintUrl") or ""),
-    ]
-    text = " ".join(text_parts).lower()
-
-    rules: list[tuple[Iterable[str], str, str]] = [
-        (("chatgpt", "openai"), "chatgpt_ui", "keyword: chatgpt/openai"),
-        (("claude", "anthropic"), "claude_ui", "keyword: claude/anthropic"),
-        (("gemini", "bard"), "gemini_ui", "keyword: gemini/bard"),
-        (("copilot",), "copilot_ui", "keyword: copilot"),
-        (("perplexity",), "perplexity_ui", "keyword: perplexity"),
-        (("deepseek",), "deepseek_ui", "keyword: deepseek"),
-        (("poe.com", "poe "), "poe_ui", "keyword: poe"),
-    ]
+METADATA_KEYWORD_RULES: list[tuple[tuple[str, ...], str, str]] = [
+    (("chatgpt", "openai"), "chatgpt_ui", "keyword: chatgpt/openai"),
+    (("claude", "anthropic"), "claude_ui", "keyword: claude/anthropic"),
+    (("gemini", "bard"), "gemini_ui", "keyword: gemini/bard"),
+    (("copilot",), "copilot_ui", "keyword: copilot"),
+    (("perplexity",), "perplexity_ui", "keyword: perplexity"),
+    (("deepseek",), "deepseek_ui", "keyword: deepseek"),
+    (("poe.com", "poe "), "poe_ui", "keyword: poe"),
+]
 
-    for keywords, suggested, reason in rules:
-        if any(keyword in text for keyword in keywords):
-            return suggested, reason, 0.8
 
+def _detector_suggestion(metadata: dict) -> tuple[str, str, float] | None:
+    # Fallback for sidecars no keyword rule matched.
     detection = metadata.get("detection")
-    if isinstance(detection, dict):
-        if bool(detection.get("isAiUiDetected")):
-            confidence = float(detection.get("confidence") or 0.6)
-            return "ai_ui", "detector marked ai_ui", min(max(confidence, 0.0), 1.0)
+    if isinstance(detection, dict) and bool(detection.get("isAiUiDetected")):
+        confidence = float(detection.get("confidence") or 0.6)
+        return "ai_ui", "detector marked ai_ui", min(max(confidence, 0.0), 1.0)
+    return None
+
+
+def classify_metadata_batch(metadata_items: list[dict]) -> list[tuple[str | None, str, float]]:
+    """Classifies many sidecars at once: first matching keyword rule wins, then the detector fallback."""
+    if not metadata_items:
+        return []
+
+    text = pd.Series(
+        [
+            f"{metadata.get('activeWindowTitle') or ''} "
+            f"{metadata.get('activeProcessName') or ''} "
+            f"{metadata.get('browserHintUrl') or ''}"
+            for metadata in metadata_items
+        ],
+        dtype=object,
+    ).str.lower()
+
+    count = len(metadata_items)
+    suggested = np.full(count, None, dtype=object)
+    reasons = np.full(count, "", dtype=object)
+    confidences = np.zeros(count, dtype=np.float64)
+    unmatched = np.ones(count, dtype=bool)
+
+    for keywords, label, reason in METADATA_KEYWORD_RULES:
+        pattern = "|".join(re.escape(keyword) for keyword in keywords)
+        hits = text.str.contains(pattern, regex=True).to_numpy(dtype=bool) & unmatched
+        suggested[hits] = label
+        reasons[hits] = reason
+        confidences[hits] = 0.8
+        unmatched &= ~hits
+
+    for index in np.flatnonzero(unmatched):
+        detected = _detector_suggestion(metadata_items[index])
+        if detected is not None:
+            suggested[index], reasons[index], confidences[index] = detected
+
+    return list(zip(suggested.tolist(), reasons.tolist(), confidences.tolist()))
+
+
+def _metadata_rules_fingerprint() -> str:
+    # Covers the keyword rules and the code applying them, so editing either invalidates cached classifications.
+    parts = [repr(METADATA_KEYWORD_RULES)]
+    for function in (classify_metadata_batch, _detector_suggestion):
+        try:
+            parts.append(inspect.getsource(function))
+        except (OSError, TypeError):
+            parts.append(function.__code__.co_code.hex())
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
 
-    return None, "", 0.0
 
+METADATA_RULES_FINGERPRINT = _metadata_rules_fingerprint()
 
-def build_review_queue(
-    dataset_root: Path,
+
+def _stat_sidecar(metadata_path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(metadata_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_metadata(metadata_path: str) -> dict | None:
+    try:
+        with open(metadata_path, "rb") as file:
+            payload = file.read()
+    except OSError:
+        return None
+
+    try:
+        metadata = orjson.loads(payload) if orjson is not None else json.loads(payload)
+    except Exception:
+        return None
+
+    return metadata if isinstance(metadata, dict) else None
+
+
+def filter_review_queue(
     labels_df: pd.DataFrame,
+    classified_by_image: dict[str, tuple[str, str, float, str]],
     image_column: str,
     label_column: str,
 ) -> list[Suggestion]:
+    images = labels_df[image_column].astype(str).str.strip().str.replace("\\", "/", regex=False).to_numpy()
+    current_labels = labels_df[label_column].astype(str).str.strip().to_numpy()
     suggestions: list[Suggestion] = []
 
-    for _, row in labels_df.iterrows():
-        image_rel = str(row[image_column]).strip().replace("\\", "/")
-        if not image_rel:
-            continue
-        current_label = str(row[label_column]).strip()
-        metadata_path = metadata_path_for_image(dataset_root, image_rel)
-        if not metadata_path.exists():
-            continue
-
-        try:
-            metadata = json.loads(metadata_path.read_text(encoding="utf-8"))
-        except Exception:
-            continue
-
-        suggested_label, reason, confidence = class_from_metadata(metadata)
-        if not suggested_label:
+    for image_rel, current_label in zip(images, current_labels):
+        classified = classified_by_image.get(image_rel)
+        if classified is None:
             continue
 
+        suggested_label, reason, confidence, metadata_rel = classified
         if current_label and current_label == suggested_label:
             continue
 
@@ -254,7 +383,7 @@ def build_review_queue(
                 current_label=current_label,
                 suggested_label=suggested_label,
                 reason=reason,
-                metadata_path=normalize_relative(metadata_path, dataset_root),
+                metadata_path=metadata_rel,
                 confidence=confidence,
             )
         )
@@ -262,6 +391,101 @@ def build_review_queue(
     return suggestions
 
 
+def load_metadata_cache(cache_path: Path) -> dict[tuple[str, int, int], tuple[str | None, str, float]]:
+    if not cache_path.exists():
+        return {}
+
+    try:
+        frame = pd.read_csv(
+            cache_path,
+            dtype={"metadata_path": str, "suggested_label": str, "reason": str, "rules_fingerprint": str},
+        ).fillna("")
+        if not (frame["rules_fingerprint"] == METADATA_RULES_FINGERPRINT).all():
+            return {}
+        return {
+            (path, int(mtime_ns), int(size)): (label or None, reason, float(confidence))
+            for path, mtime_ns, size, label, reason, confidence in zip(
+                frame["metadata_path"].to_numpy(),
+                frame["mtime_ns"].to_numpy(),
+                frame["size"].to_numpy(),
+                frame["suggested_label"].to_numpy(),
+                frame["reason"].to_numpy(),
+                frame["confidence"].to_numpy(),
+            )
+        }
+    except Exception:
+        # A corrupt cache only costs a full rescan.
+        return {}
+
+
+def write_metadata_cache(cache_path: Path, cache: dict[tuple[str, int, int], tuple[str | None, str, float]]) -> None:
+    ensure_parent(cache_path)
+    rows = [
+        (path, mtime_ns, size, label or "", reason, confidence, METADATA_RULES_FINGERPRINT)
+        for (path, mtime_ns, size), (label, reason, confidence) in cache.items()
+    ]
+    frame = pd.DataFrame(
+        rows,
+        columns=["metadata_path", "mtime_ns", "size", "suggested_label", "reason", "confidence", "rules_fingerprint"],
+    )
+    frame.to_csv(cache_path, index=False, encoding="utf-8")
+
+
+def build_review_queue(
+    dataset_root: Path,
+    labels_df: pd.DataFrame,
+    image_column: str,
+    label_column: str,
+    cache_path: Path | None = None,
+) -> tuple[list[Suggestion], dict[str, tuple[str, str, float, str]]]:
+    root = str(dataset_root).replace("\\", "/").rstrip("/")
+    jobs: list[tuple[str, str, str]] = []
+
+    for image_rel in labels_df[image_column].astype(str).str.strip().str.replace("\\", "/", regex=False):
+        if not image_rel:
+            continue
+        metadata_rel = metadata_rel_for_image(image_rel)
+        jobs.append((image_rel, f"{root}/{metadata_rel}", metadata_rel))
+
+    cached = load_metadata_cache(cache_path) if cache_path is not None else {}
+    current: dict[tuple[str, int, int], tuple[str | None, str, float]] = {}
+    keyed_jobs: list[tuple[str, str, tuple[str, int, int]]] = []
+    pending: list[tuple[str, tuple[str, int, int]]] = []
+
+    if jobs:
+        # Sidecar I/O releases the GIL, so threads overlap it well.
+        with ThreadPoolExecutor(max_workers=METADATA_READ_WORKERS) as executor:
+            stats = executor.map(_stat_sidecar, [metadata_path for _, metadata_path, _ in jobs], chunksize=64)
+            for (image_rel, metadata_path, metadata_rel), stat in zip(jobs, stats):
+                if stat is None:
+                    continue
+                key = (metadata_rel, stat[0], stat[1])
+                keyed_jobs.append((image_rel, metadata_rel, key))
+                if key in cached:
+                    current[key] = cached[key]
+                elif key not in current:
+                    current[key] = (None, "", 0.0)
+                    pending.append((metadata_path, key))
+
+            loaded = list(executor.map(_load_metadata, [metadata_path for metadata_path, _ in pending], chunksize=64))
+
+        parsed = [(key, metadata) for (_, key), metadata in zip(pending, loaded) if metadata is not None]
+        for (key, _), classification in zip(parsed, classify_metadata_batch([metadata for _, metadata in parsed])):
+            current[key] = classification
+
+    if cache_path is not None and (pending or len(current) != len(cached)):
+        write_metadata_cache(cache_path, current)
+
+    classified_by_image: dict[str, tuple[str, str, float, str]] = {}
+    for image_rel, metadata_rel, key in keyed_jobs:
+        suggested_label, reason, confidence = current[key]
+        if suggested_label:
+            classified_by_image[image_rel] = (suggested_label, reason, confidence, metadata_rel)
+
+    suggestions = filter_review_queue(labels_df, classified_by_image, image_column, label_column)
+    return suggestions, classified_by_image
+
+
 def write_review_queue(queue_path: Path, suggestions: list[Suggestion]) -> None:
     ensure_parent(queue_path)
     with queue_path.open("w", newline="", encoding="utf-8") as file:
@@ -348,17 +572,23 @@ def split_stratified(
     val_ratio: float,
     seed: int,
 ) -> tuple[list[str], list[str], list[str]]:
-    rng = random.Random(seed)
-    train: list[str] = []
-    val: list[str] = []
-    test: list[str] = []
-
-    for label, group in frame.groupby(label_column):
-        items = group[image_column].astype(str).tolist()
-        rng.shuffle(items)
+    rng = np.random.default_rng(seed)
+    train_parts: list[np.ndarray] = []
+    val_parts: list[np.ndarray] = []
+    test_parts: list[np.ndarray] = []
+
+    codes, _ = pd.factorize(frame[label_column].to_numpy(), sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+    images = frame[image_column].astype(str).to_numpy()[valid]
+    order = np.argsort(codes, kind="stable")
+    buckets = np.split(images[order], np.cumsum(np.bincount(codes))[:-1]) if len(codes) else []
+
+    for items in buckets:
+        items = rng.permutation(items)
         n = len(items)
         if n == 1:
-            train.extend(items)
+            train_parts.append(items)
             continue
 
         train_count = int(n * train_ratio)
@@ -384,19 +614,23 @@ def split_stratified(
             test_count = 0
             val_count = n - train_count
 
-        train.extend(items[:train_count])
-        val.extend(items[train_count : train_count + val_count])
-        test.extend(items[train_count + val_count : train_count + val_count + test_count])
+        train_parts.append(items[:train_count])
+        val_parts.append(items[train_count : train_count + val_count])
+        test_parts.append(items[train_count + val_count : train_count + val_count + test_count])
 
-    rng.shuffle(train)
-    rng.shuffle(val)
-    rng.shuffle(test)
-    return train, val, test
+    def _finish(parts: list[np.ndarray]) -> list[str]:
+        if not parts:
+            return []
+        return rng.permutation(np.concatenate(parts)).tolist()
+
+    return _finish(train_parts), _finish(val_parts), _finish(test_parts)
 
 
 def write_split(path: Path, values: list[str]) -> None:
     ensure_parent(path)
-    path.write_text("\n".join(values), encoding="utf-8")
+    payload = b"\n".join(value.encode("utf-8") for value in values)
+    with path.open("wb") as file:
+        file.write(payload)
 
 
 def main() -> None:
@@ -416,6 +650,7 @@ def main() -> None:
     raw_root = dataset_root / "raw"
     labels_csv = paths.labels_csv
     review_csv = dataset_root / "labels" / "review_queue.csv"
+    metadata_cache_csv = dataset_root / "labels" / ".metadata_cache.csv"
 
     images = find_images(raw_root)
     if not images:
@@ -434,11 +669,12 @@ def main() -> None:
         label_column=paths.label_column,
     )
 
-    suggestions_before = build_review_queue(
+    suggestions_before, classified_by_image = build_review_queue(
         dataset_root=dataset_root,
         labels_df=merged,
         image_column=paths.image_column,
         label_column=paths.label_column,
+        cache_path=metadata_cache_csv,
     )
     auto_applied = 0
     if args.auto_apply_suggestions:
@@ -451,9 +687,10 @@ def main() -> None:
             apply_mode=args.suggestion_apply_mode,
         )
 
-    suggestions_after = build_review_queue(
-        dataset_root=dataset_root,
+    # Sidecars are unchanged by apply_suggestions, so only re-filter against updated labels.
+    suggestions_after = filter_review_queue(
         labels_df=merged,
+        classified_by_image=classified_by_image,
         image_column=paths.image_column,
         label_column=paths.label_column,
     )
@@ -462,7 +699,24 @@ def main() -> None:
     merged.to_csv(labels_csv, index=False, encoding="utf-8")
     write_review_queue(review_csv, suggestions_after)
 
+    # Duplicates keep their CSV rows (and labels); they are only kept out of the splits so that
+    # identical images cannot land in both train and val.
+    duplicate_rel_paths: set[str] = set()
+    if not args.keep_duplicate_images and len(images) > 1:
+        digest_by_image = dict(zip(image_rel_paths, hash_images(images)))
+        duplicate_rel_paths, conflicts = find_duplicate_rows(
+            merged,
+            digest_by_image,
+            image_column=paths.image_column,
+            label_column=paths.label_column,
+        )
+        for rows in conflicts:
+            copies = ", ".join(f"{image_rel} ({label or 'unlabeled'})" for image_rel, label in rows)
+            print(f"Warning: identical images carry different labels: {copies}")
+
     labeled = merged[merged[paths.label_column].astype(str).str.strip() != ""].copy()
+    if duplicate_rel_paths:
+        labeled = labeled[~labeled[paths.image_column].astype(str).isin(duplicate_rel_paths)].copy()
     if labeled.empty:
         write_split(paths.train_split, [])
         write_split(paths.val_split, [])
@@ -499,6 +753,8 @@ def main() -> None:
 
     print("prepare_labels completed.")
     print(f"Images found: {len(image_rel_paths)}")
+    if duplicate_rel_paths:
+        print(f"Duplicate images kept out of splits: {len(duplicate_rel_paths)}")
     print(f"CSV rows: {len(merged)}")
     print(f"Labeled rows: {len(labeled)}")
     if args.auto_apply_suggestions:
@@ -4,6 +4,7 @@ import argparse
 from pathlib import Path
 
 try:
+    import numpy as np
     import pandas as pd
     import torch
     from torch import nn
@@ -12,11 +13,13 @@ try:
     from common import (
         CsvImageDataset,
         apply_split,
+        compile_model,
         create_loader,
         create_model,
         create_transforms,
         ensure_dataset_ready,
         evaluate_model,
+        get_autocast_dtype,
         get_device,
         load_config,
         print_dataset_summary,
@@ -24,6 +27,7 @@ try:
         read_dataset_paths,
         read_labels_dataframe,
         read_split_file,
+        resolve_num_workers,
         save_json,
         set_seed,
     )
@@ -49,12 +53,17 @@ def main() -> None:
 
     seed = int(training_cfg.get("seed", 42))
     set_seed(seed)
+    # Lets any FP32 matmuls left outside autocast use TF32 tensor cores.
+    torch.set_float32_matmul_precision("high")
+    # Input shapes are fixed by image_size, so cuDNN can pick and cache the fastest kernels.
+    torch.backends.cudnn.benchmark = True
 
     labels = read_labels_dataframe(paths)
     positive_labels = {str(item).strip() for item in binary_cfg.get("positive_labels", ["ai_ui"])}
     negative_labels = {str(item).strip() for item in binary_cfg.get("negative_labels", ["not_ai_ui"])}
     allowed = positive_labels | negative_labels
-    labels = labels[labels[paths.label_column].astype(str).isin(allowed)].copy()
+    label_values = labels[paths.label_column].astype(str).to_numpy()
+    labels = labels.loc[np.isin(label_values, list(allowed))].copy()
 
     if labels.empty:
         raise RuntimeError(
@@ -62,7 +71,8 @@ def main() -> None:
             "Check config.binary.positive_labels / negative_labels and docs/ml/03-labeling-guide.md"
         )
 
-    labels[paths.label_column] = labels[paths.label_column].astype(str).apply(lambda x: "ai_ui" if x in positive_labels else "not_ai_ui")
+    positive_mask = np.isin(labels[paths.label_column].astype(str).to_numpy(), list(positive_labels))
+    labels[paths.label_column] = np.where(positive_mask, "ai_ui", "not_ai_ui")
 
     train_split = read_split_file(paths.train_split)
     val_split = read_split_file(paths.val_split)
@@ -79,7 +89,8 @@ def main() -> None:
     label_to_index = {"not_ai_ui": 0, "ai_ui": 1}
     image_size = int(training_cfg.get("image_size", 224))
     batch_size = int(training_cfg.get("batch_size", 32))
-    num_workers = int(training_cfg.get("num_workers", 2))
+    num_workers = resolve_num_workers(training_cfg.get("num_workers", "auto"))
+    prefetch_factor = int(training_cfg.get("prefetch_factor", 4))
 
     train_dataset = CsvImageDataset(
         train_rows,
@@ -98,15 +109,29 @@ def main() -> None:
         create_transforms(image_size, is_train=False),
     )
 
-    train_loader = create_loader(train_dataset, batch_size, num_workers, shuffle=True)
-    val_loader = create_loader(val_dataset, batch_size, num_workers, shuffle=False)
+    train_loader = create_loader(
+        train_dataset,
+        batch_size,
+        num_workers,
+        shuffle=True,
+        prefetch_factor=prefetch_factor,
+        drop_last=len(train_dataset) > batch_size,
+    )
+    val_loader = create_loader(val_dataset, batch_size, num_workers, shuffle=False, prefetch_factor=prefetch_factor)
 
     device = get_device()
+    channels_last = bool(training_cfg.get("channels_last", True))
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
     model = create_model(
         model_name=str(training_cfg.get("model_name", "mobilenet_v3_small")),
         num_classes=2,
         use_pretrained=bool(training_cfg.get("use_pretrained", True)),
-    ).to(device)
+    ).to(device, memory_format=memory_format)
+    # Checkpoints are saved from the eager module so state_dict keys stay loadable by eval/export.
+    train_model = compile_model(model, bool(training_cfg.get("compile_model", False)), device)
+
+    autocast_dtype = get_autocast_dtype(str(training_cfg.get("precision", "bf16")), device)
+    scaler = torch.amp.GradScaler(device.type, enabled=autocast_dtype == torch.float16)
 
     criterion = nn.CrossEntropyLoss()
     optimizer = torch.optim.AdamW(
@@ -125,25 +150,35 @@ def main() -> None:
     history: list[dict] = []
 
     for epoch in range(1, epochs + 1):
-        model.train()
-        train_losses: list[float] = []
+        train_model.train()
+        running_loss = torch.zeros((), device=device)
+        batch_count = 0
 
         progress = tqdm(train_loader, desc=f"binary epoch {epoch}/{epochs}", unit="batch")
         for images, targets in progress:
-            images = images.to(device)
-            targets = targets.to(device)
+            images = images.to(device, memory_format=memory_format, non_blocking=True)
+            targets = targets.to(device, non_blocking=True)
 
             optimizer.zero_grad(set_to_none=True)
-            logits = model(images)
-            loss = criterion(logits, targets)
-            loss.backward()
-            optimizer.step()
-
-            train_losses.append(float(loss.item()))
-            progress.set_postfix(loss=f"{loss.item():.4f}")
-
-        val_metrics = evaluate_model(model, val_loader, device, criterion)
-        train_loss = float(sum(train_losses) / max(1, len(train_losses)))
+            with torch.autocast(
+                device_type=device.type,
+                dtype=autocast_dtype or torch.bfloat16,
+                enabled=autocast_dtype is not None,
+            ):
+                logits = train_model(images)
+                loss = criterion(logits, targets)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
+
+            # Accumulate on device; .item() would force a host sync every step.
+            running_loss += loss.detach().float()
+            batch_count += 1
+            if batch_count % 20 == 0:
+                progress.set_postfix(loss=f"{loss.item():.4f}")
+
+        val_metrics = evaluate_model(train_model, val_loader, device, criterion)
+        train_loss = float(running_loss.item() / max(1, batch_count))
         epoch_metrics = {
             "epoch": epoch,
             "train_loss": train_loss,
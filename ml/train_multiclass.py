@@ -12,11 +12,13 @@ try:
     from common import (
         CsvImageDataset,
         apply_split,
+        compile_model,
         create_loader,
         create_model,
         create_transforms,
         ensure_dataset_ready,
         evaluate_model,
+        get_autocast_dtype,
         get_device,
         load_config,
         print_dataset_summary,
@@ -24,6 +26,7 @@ try:
         read_dataset_paths,
         read_labels_dataframe,
         read_split_file,
+        resolve_num_workers,
         save_json,
         set_seed,
     )
@@ -32,6 +35,9 @@ except ModuleNotFoundError as exc:
     raise SystemExit(1) from exc
 
 
+LOSS_DISPLAY_INTERVAL = 50
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Train multiclass AI UI detector.")
     parser.add_argument("--config", required=True, help="Path to YAML config file (see ml/config.example.yaml).")
@@ -53,6 +59,10 @@ def main() -> None:
 
     seed = int(training_cfg.get("seed", 42))
     set_seed(seed)
+    # Lets any FP32 matmuls left outside autocast use TF32 tensor cores.
+    torch.set_float32_matmul_precision("high")
+    # Input shapes are fixed by image_size, so cuDNN can pick and cache the fastest kernels.
+    torch.backends.cudnn.benchmark = True
 
     labels = read_labels_dataframe(paths)
     labels = labels[labels[paths.label_column].astype(str).isin(class_labels)].copy()
@@ -77,7 +87,8 @@ def main() -> None:
     label_to_index = {label: index for index, label in enumerate(class_labels)}
     image_size = int(training_cfg.get("image_size", 224))
     batch_size = int(training_cfg.get("batch_size", 32))
-    num_workers = int(training_cfg.get("num_workers", 2))
+    num_workers = resolve_num_workers(training_cfg.get("num_workers", "auto"))
+    prefetch_factor = int(training_cfg.get("prefetch_factor", 4))
 
     train_dataset = CsvImageDataset(
         train_rows,
@@ -96,15 +107,34 @@ def main() -> None:
         create_transforms(image_size, is_train=False),
     )
 
-    train_loader = create_loader(train_dataset, batch_size, num_workers, shuffle=True)
-    val_loader = create_loader(val_dataset, batch_size, num_workers, shuffle=False)
+    train_loader = create_loader(
+        train_dataset,
+        batch_size,
+        num_workers,
+        shuffle=True,
+        prefetch_factor=prefetch_factor,
+        drop_last=len(train_dataset) > batch_size,
+    )
+    val_loader = create_loader(val_dataset, batch_size, num_workers, shuffle=False, prefetch_factor=prefetch_factor)
 
     device = get_device()
+    channels_last = bool(training_cfg.get("channels_last", True))
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
     model = create_model(
         model_name=str(training_cfg.get("model_name", "mobilenet_v3_small")),
         num_classes=len(class_labels),
         use_pretrained=bool(training_cfg.get("use_pretrained", True)),
-    ).to(device)
+    ).to(device, memory_format=memory_format)
+    # Checkpoints are saved from the eager module so state_dict keys stay loadable by eval/export.
+    train_model = compile_model(
+        model,
+        bool(training_cfg.get("compile_model", False)),
+        device,
+        mode="reduce-overhead",
+    )
+
+    autocast_dtype = get_autocast_dtype(str(training_cfg.get("precision", "bf16")), device)
+    scaler = torch.amp.GradScaler(device.type, enabled=autocast_dtype == torch.float16)
 
     criterion = nn.CrossEntropyLoss()
     optimizer = torch.optim.AdamW(
@@ -122,26 +152,44 @@ def main() -> None:
     best_f1 = -1.0
     history: list[dict] = []
 
+    accum_steps = max(1, int(training_cfg.get("grad_accum_steps", 1)))
+    steps_per_epoch = len(train_loader)
+
     for epoch in range(1, epochs + 1):
-        model.train()
-        train_losses: list[float] = []
+        train_model.train()
+        running_loss = torch.zeros((), device=device)
+        # Last two step losses stay on device; the progress bar reads the finished one every few steps.
+        loss_ring = torch.zeros(2, device=device)
+        batch_count = 0
+        optimizer.zero_grad(set_to_none=True)
 
         progress = tqdm(train_loader, desc=f"multiclass epoch {epoch}/{epochs}", unit="batch")
         for images, targets in progress:
-            images = images.to(device)
-            targets = targets.to(device)
-
-            optimizer.zero_grad(set_to_none=True)
-            logits = model(images)
-            loss = criterion(logits, targets)
-            loss.backward()
-            optimizer.step()
-
-            train_losses.append(float(loss.item()))
-            progress.set_postfix(loss=f"{loss.item():.4f}")
-
-        val_metrics = evaluate_model(model, val_loader, device, criterion)
-        train_loss = float(sum(train_losses) / max(1, len(train_losses)))
+            images = images.to(device, memory_format=memory_format, non_blocking=True)
+            targets = targets.to(device, non_blocking=True)
+
+            with torch.autocast(
+                device_type=device.type,
+                dtype=autocast_dtype or torch.bfloat16,
+                enabled=autocast_dtype is not None,
+            ):
+                logits = train_model(images)
+                loss = criterion(logits, targets)
+            scaler.scale(loss / accum_steps).backward()
+
+            # Accumulate on device; .item() would force a host sync every step.
+            running_loss += loss.detach().float()
+            loss_ring[batch_count % 2] = loss.detach().float()
+            batch_count += 1
+            if batch_count % accum_steps == 0 or batch_count == steps_per_epoch:
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad(set_to_none=True)
+            if batch_count % LOSS_DISPLAY_INTERVAL == 0:
+                progress.set_postfix(loss=f"{loss_ring[batch_count % 2].item():.4f}")
+
+        val_metrics = evaluate_model(train_model, val_loader, device, criterion)
+        train_loss = float(running_loss.item() / max(1, batch_count))
         epoch_metrics = {
             "epoch": epoch,
             "train_loss": train_loss,
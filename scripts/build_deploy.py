@@ -1,20 +1,29 @@
 ﻿import argparse
 import getpass
+import hashlib
 import json
 import os
+import queue
+import shlex
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse
 
 
+_log_lock = threading.Lock()
+
+
 def log(message: str, file_handle=None) -> None:
     line = message.rstrip()
-    print(line)
-    if file_handle is not None:
-        file_handle.write(line + "\n")
-        file_handle.flush()
+    with _log_lock:
+        print(line)
+        if file_handle is not None:
+            file_handle.write(line + "\n")
+            file_handle.flush()
 
 
 def require_paramiko():
@@ -36,9 +45,15 @@ def run_build(repo_root: Path, log_file) -> None:
 
 
 def load_manifest(manifest_path: Path) -> dict:
+    data = manifest_path.read_bytes()
     # PowerShell may write UTF-8 files with BOM on Windows.
-    with manifest_path.open("r", encoding="utf-8-sig") as fh:
-        return json.load(fh)
+    if data.startswith(b"\xef\xbb\xbf"):
+        data = data[3:]
+    try:
+        import orjson  # type: ignore
+    except Exception:
+        return json.loads(data)
+    return orjson.loads(data)
 
 
 def installer_name_from_manifest(manifest: dict, manifest_path: Path) -> str:
@@ -73,10 +88,133 @@ def sftp_mkdir_p(sftp, remote_dir: str) -> None:
             sftp.mkdir(current)
 
 
-def sftp_put_file(sftp, local_path: Path, remote_path: str, log_file) -> None:
+SFTP_CHUNK_SIZE = 1024 * 1024
+SSH_WINDOW_SIZE = 64 * 1024 * 1024
+
+
+def ssh_mkdir_p(ssh, remote_dirs: list[str], log_file) -> bool:
+    # One remote round trip for all directories; False tells the caller to fall back to SFTP.
+    quoted = " ".join(shlex.quote(d.replace("\\", "/").rstrip("/")) for d in remote_dirs)
+    cmd = f"mkdir -p {quoted}"
+    log(f"> {cmd}", log_file)
+    try:
+        _, stdout, stderr = ssh.exec_command(cmd)
+        exit_code = stdout.channel.recv_exit_status()
+    except Exception as ex:
+        log(f"> mkdir over ssh exec failed ({ex}); falling back to sftp", log_file)
+        return False
+    if exit_code != 0:
+        err_text = stderr.read().decode("utf-8", errors="replace").strip()
+        log(f"> mkdir over ssh exec failed ({exit_code}): {err_text or 'unknown error'}; falling back to sftp", log_file)
+        return False
+    return True
+
+
+def sha256_of(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(SFTP_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sftp_read_sidecar_hash(sftp, remote_path: str) -> str | None:
+    try:
+        with sftp.open(f"{remote_path}.sha256", "rb") as fh:
+            return fh.read().decode("ascii", errors="replace").strip().lower()
+    except OSError:
+        return None
+
+
+def sftp_put_file(
+    sftp,
+    local_path: Path,
+    remote_path: str,
+    log_file,
+    skip_unchanged: bool = False,
+    write_sidecar: bool = False,
+) -> None:
     remote_path = remote_path.replace("\\", "/")
+    local_size = local_path.stat().st_size
+    local_hash = sha256_of(local_path) if skip_unchanged or write_sidecar else None
+    if skip_unchanged:
+        # A matching remote <file>.sha256 sidecar (and size) means the file is already in place.
+        if sftp_read_sidecar_hash(sftp, remote_path) == local_hash:
+            try:
+                remote_size = sftp.stat(remote_path).st_size
+            except OSError:
+                remote_size = None
+            if remote_size == local_size:
+                log(f"> skip unchanged {local_path} -> {remote_path}", log_file)
+                return
     log(f"> put {local_path} -> {remote_path}", log_file)
-    sftp.put(str(local_path), remote_path)
+    if write_sidecar:
+        # Drop the old sidecar first so an interrupted upload never leaves it describing other bytes.
+        try:
+            sftp.remove(f"{remote_path}.sha256")
+        except OSError:
+            pass
+    with local_path.open("rb") as local_fh, sftp.open(remote_path, "wb") as remote_fh:
+        # Pipelined writes keep many SFTP WRITE packets in flight instead of waiting for each ack.
+        remote_fh.set_pipelined(True)
+        while True:
+            chunk = local_fh.read(SFTP_CHUNK_SIZE)
+            if not chunk:
+                break
+            remote_fh.write(chunk)
+    remote_size = sftp.stat(remote_path).st_size
+    if remote_size != local_size:
+        raise RuntimeError(f"Size mismatch after upload of {local_path}: local={local_size}, remote={remote_size}")
+    if write_sidecar:
+        with sftp.open(f"{remote_path}.sha256", "wb") as fh:
+            fh.write(f"{local_hash}\n".encode("ascii"))
+
+
+def open_sftp_session(ssh):
+    sftp = ssh.open_sftp()
+    sftp.get_channel().settimeout(None)
+    return sftp
+
+
+def sftp_put_files_parallel(
+    ssh,
+    uploads: list[tuple[Path, str]],
+    workers: int,
+    log_file,
+    skip_unchanged: bool = False,
+    write_sidecar: bool = False,
+) -> None:
+    if not uploads:
+        return
+    count = max(1, min(workers, len(uploads)))
+    # One SFTP channel per worker, all multiplexed over the same SSH transport.
+    sessions: queue.Queue = queue.Queue()
+    opened = []
+    try:
+        for _ in range(count):
+            sftp = open_sftp_session(ssh)
+            opened.append(sftp)
+            sessions.put(sftp)
+
+        def put_one(upload: tuple[Path, str]) -> None:
+            sftp = sessions.get()
+            try:
+                sftp_put_file(
+                    sftp,
+                    upload[0],
+                    upload[1],
+                    log_file,
+                    skip_unchanged=skip_unchanged,
+                    write_sidecar=write_sidecar,
+                )
+            finally:
+                sessions.put(sftp)
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            list(executor.map(put_one, uploads))
+    finally:
+        for sftp in opened:
+            sftp.close()
 
 
 def sftp_prune_old_update_installers(sftp, remote_dir: str, keep_installer_name: str, log_file) -> None:
@@ -90,6 +228,10 @@ def sftp_prune_old_update_installers(sftp, remote_dir: str, keep_installer_name:
         remote_path = f"{remote_dir}/{name}"
         log(f"> rm stale {remote_path}", log_file)
         sftp.remove(remote_path)
+        try:
+            sftp.remove(f"{remote_path}.sha256")
+        except OSError:
+            pass
 
 
 def main() -> int:
@@ -117,6 +259,12 @@ def main() -> int:
     parser.add_argument("--updates-path", default="/var/www/controledu/updates")
     parser.add_argument("--installers-path", default="/var/www/controledu/installers")
     parser.add_argument("--artifacts-root", default="artifacts")
+    parser.add_argument("--parallel-uploads", type=int, default=4, help="Number of concurrent SFTP uploads.")
+    parser.add_argument(
+        "--force-upload",
+        action="store_true",
+        help="Upload installers even when the remote .sha256 sidecar matches the local file.",
+    )
     args = parser.parse_args()
 
     repo_root = Path(__file__).resolve().parents[1]
@@ -187,30 +335,54 @@ def main() -> int:
                     if exit_code != 0:
                         raise RuntimeError(f"Remote clean failed ({exit_code}): {err_text or 'unknown error'}")
 
-                sftp = ssh.open_sftp()
+                transport = ssh.get_transport()
+                if transport is not None:
+                    # Applies to channels opened from here on, including the SFTP session below.
+                    transport.default_window_size = SSH_WINDOW_SIZE
+                sftp = open_sftp_session(ssh)
                 try:
                     updates_base = args.updates_path.rstrip("/")
                     teacher_remote_dir = f"{updates_base}/teacher"
                     student_remote_dir = f"{updates_base}/student"
-                    sftp_mkdir_p(sftp, teacher_remote_dir)
-                    sftp_mkdir_p(sftp, student_remote_dir)
+                    remote_dirs = [teacher_remote_dir, student_remote_dir]
                     if args.with_installers:
-                        sftp_mkdir_p(sftp, args.installers_path.rstrip("/"))
-
-                    sftp_put_file(sftp, teacher_installer_local, f"{teacher_remote_dir}/{teacher_installer_name}", log_file)
-                    sftp_put_file(sftp, student_installer_local, f"{student_remote_dir}/{student_installer_name}", log_file)
-                    sftp_put_file(sftp, teacher_manifest_path, f"{teacher_remote_dir}/manifest.json", log_file)
-                    sftp_put_file(sftp, student_manifest_path, f"{student_remote_dir}/manifest.json", log_file)
-                    sftp_prune_old_update_installers(sftp, teacher_remote_dir, teacher_installer_name, log_file)
-                    sftp_prune_old_update_installers(sftp, student_remote_dir, student_installer_name, log_file)
-
+                        remote_dirs.append(args.installers_path.rstrip("/"))
+                    if not ssh_mkdir_p(ssh, remote_dirs, log_file):
+                        for remote_dir in remote_dirs:
+                            sftp_mkdir_p(sftp, remote_dir)
+
+                    installer_uploads = [
+                        (teacher_installer_local, f"{teacher_remote_dir}/{teacher_installer_name}"),
+                        (student_installer_local, f"{student_remote_dir}/{student_installer_name}"),
+                    ]
                     if args.with_installers:
                         files = [p for p in installers_local.iterdir() if p.is_file()]
                         if not files:
                             raise RuntimeError(f"No files found in installers folder: {installers_local}")
                         installers_remote = args.installers_path.rstrip("/")
-                        for p in files:
-                            sftp_put_file(sftp, p, f"{installers_remote}/{p.name}", log_file)
+                        installer_uploads.extend((p, f"{installers_remote}/{p.name}") for p in files)
+
+                    # Manifests go up only after every installer they may reference is in place.
+                    sftp_put_files_parallel(
+                        ssh,
+                        installer_uploads,
+                        args.parallel_uploads,
+                        log_file,
+                        skip_unchanged=not args.force_upload,
+                        # Written on forced uploads too, so the next normal run compares against these bytes.
+                        write_sidecar=True,
+                    )
+                    sftp_put_files_parallel(
+                        ssh,
+                        [
+                            (teacher_manifest_path, f"{teacher_remote_dir}/manifest.json"),
+                            (student_manifest_path, f"{student_remote_dir}/manifest.json"),
+                        ],
+                        args.parallel_uploads,
+                        log_file,
+                    )
+                    sftp_prune_old_update_installers(sftp, teacher_remote_dir, teacher_installer_name, log_file)
+                    sftp_prune_old_update_installers(sftp, student_remote_dir, student_installer_name, log_file)
                 finally:
                     sftp.close()
             finally:
@@ -1,32 +1,67 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import shutil
 import tempfile
 from pathlib import Path
+from typing import BinaryIO
 
 from fastapi import HTTPException, UploadFile, status
 
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload is too large. Limit is {max_bytes // (1024 * 1024)} MB.",
+    )
+
+
+def _preallocate(handle: BinaryIO, size: int) -> None:
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(handle.fileno(), 0, size)
+    except OSError:
+        # Not every filesystem supports fallocate; the copy works the same without it.
+        pass
+
+
+def _copy_upload_sync(
+    source: BinaryIO,
+    directory: Path,
+    suffix: str,
+    max_bytes: int,
+    expected_size: int | None,
+) -> Path:
+    with tempfile.NamedTemporaryFile(delete=False, dir=directory, suffix=suffix) as handle:
+        if expected_size is not None:
+            _preallocate(handle, expected_size)
+        shutil.copyfileobj(source, handle, length=COPY_BUFFER_SIZE)
+        size = handle.tell()
+        if expected_size is not None and size != expected_size:
+            handle.truncate(size)
+
+    temp_path = Path(handle.name)
+    if size > max_bytes:
+        temp_path.unlink(missing_ok=True)
+        raise _too_large(max_bytes)
+    return temp_path
+
 
 async def save_upload_to_temp_file(
     upload: UploadFile,
     directory: Path,
     max_bytes: int,
 ) -> Path:
+    # The multipart parser has already spooled the body, so its size is usually known up front.
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+
     directory.mkdir(parents=True, exist_ok=True)
     suffix = Path(upload.filename or "upload.bin").suffix or ".bin"
 
-    total = 0
-    with tempfile.NamedTemporaryFile(delete=False, dir=directory, suffix=suffix) as handle:
-        while True:
-            chunk = await upload.read(1024 * 1024)
-            if not chunk:
-                break
-            total += len(chunk)
-            if total > max_bytes:
-                Path(handle.name).unlink(missing_ok=True)
-                raise HTTPException(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    detail=f"Upload is too large. Limit is {max_bytes // (1024 * 1024)} MB.",
-                )
-            handle.write(chunk)
-
-        return Path(handle.name)
+    # Copying the spooled file is blocking I/O; keep it off the event loop.
+    return await asyncio.to_thread(_copy_upload_sync, upload.file, directory, suffix, max_bytes, upload.size)
@@ -1,41 +1,49 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Mapping
 from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
 
 
-def _get_bool(name: str, default: bool) -> bool:
-    raw = os.getenv(name)
+def _get_bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    raw = env.get(name)
     if raw is None:
         return default
     return raw.strip().lower() in {"1", "true", "yes", "on"}
 
 
-def _get_int(name: str, default: int) -> int:
-    raw = os.getenv(name)
+def _get_int(env: Mapping[str, str], name: str, default: int) -> int:
+    raw = env.get(name)
     if raw is None or not raw.strip():
         return default
     return int(raw)
 
 
-def _get_float(name: str, default: float) -> float:
-    raw = os.getenv(name)
+def _get_float(env: Mapping[str, str], name: str, default: float) -> float:
+    raw = env.get(name)
     if raw is None or not raw.strip():
         return default
     return float(raw)
 
 
-def _get_optional_int(name: str) -> int | None:
-    raw = os.getenv(name)
+def _get_optional_int(env: Mapping[str, str], name: str) -> int | None:
+    raw = env.get(name)
     if raw is None or not raw.strip():
         return None
     return int(raw)
 
 
-def _get_list(name: str) -> list[str]:
-    raw = os.getenv(name, "")
+def _get_optional_float(env: Mapping[str, str], name: str) -> float | None:
+    raw = env.get(name)
+    if not raw:
+        return None
+    return float(raw)
+
+
+def _get_list(env: Mapping[str, str], name: str) -> list[str]:
+    raw = env.get(name, "")
     return [part.strip() for part in raw.split(",") if part.strip()]
 
 
@@ -54,18 +62,23 @@ class Settings:
     temp_dir: Path
 
     tts_enabled: bool
+    tts_preload: bool
     tts_max_chars: int
     piper_bin_path: Path
     piper_models_dir: Path
     piper_default_voice: str
     piper_default_speaker_id: int | None
     piper_timeout_seconds: int
+    piper_max_processes: int
+    # None picks a private directory in /dev/shm when the service starts Piper (see PiperTtsService).
+    piper_output_dir: Path | None
     piper_default_length_scale: float
     piper_default_noise_scale: float | None
     piper_default_noise_w: float | None
     piper_default_sentence_silence: float | None
 
     stt_enabled: bool
+    stt_preload: bool
     whisper_model: str
     whisper_device: str
     whisper_compute_type: str
@@ -78,51 +91,66 @@ class Settings:
     stt_default_vad_filter: bool
     stt_default_word_timestamps: bool
     stt_max_concurrency: int
+    stt_max_queue: int
+    stt_process_pool: bool
     stt_timeout_seconds: int
 
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    host = os.getenv("SPEECH_API_HOST", "0.0.0.0")
-    port = _get_int("SPEECH_API_PORT", 8088)
-    temp_dir = Path(os.getenv("SPEECH_API_TEMP_DIR", "/tmp/controledu-speech")).resolve()
-    piper_models_dir = Path(os.getenv("PIPER_MODELS_DIR", "/models/piper")).resolve()
-    whisper_models_dir = Path(os.getenv("WHISPER_MODELS_DIR", "/models/whisper")).resolve()
+    # One snapshot of the environment instead of a lookup per variable.
+    env = dict(os.environ)
+    host = env.get("SPEECH_API_HOST", "0.0.0.0")
+    port = _get_int(env, "SPEECH_API_PORT", 8088)
+    temp_dir = Path(env.get("SPEECH_API_TEMP_DIR", "/tmp/controledu-speech")).resolve()
+    piper_models_dir = Path(env.get("PIPER_MODELS_DIR", "/models/piper")).resolve()
+    whisper_models_dir = Path(env.get("WHISPER_MODELS_DIR", "/models/whisper")).resolve()
+    raw_piper_output_dir = env.get("PIPER_OUTPUT_DIR", "").strip()
+    piper_output_dir = Path(raw_piper_output_dir).resolve() if raw_piper_output_dir else None
 
     return Settings(
         host=host,
         port=port,
-        log_level=os.getenv("SPEECH_API_LOG_LEVEL", "info"),
-        api_token=os.getenv("SPEECH_API_TOKEN", "").strip(),
-        cors_origins=_get_list("SPEECH_API_CORS_ORIGINS"),
-        ip_allowlist=_get_list("SPEECH_API_IP_ALLOWLIST"),
-        allow_unauth_health=_get_bool("SPEECH_API_ALLOW_UNAUTH_HEALTH", True),
-        docs_enabled=_get_bool("SPEECH_API_ENABLE_DOCS", True),
-        max_upload_mb=_get_int("SPEECH_API_MAX_UPLOAD_MB", 64),
+        log_level=env.get("SPEECH_API_LOG_LEVEL", "info"),
+        api_token=env.get("SPEECH_API_TOKEN", "").strip(),
+        cors_origins=_get_list(env, "SPEECH_API_CORS_ORIGINS"),
+        ip_allowlist=_get_list(env, "SPEECH_API_IP_ALLOWLIST"),
+        allow_unauth_health=_get_bool(env, "SPEECH_API_ALLOW_UNAUTH_HEALTH", True),
+        docs_enabled=_get_bool(env, "SPEECH_API_ENABLE_DOCS", True),
+        max_upload_mb=_get_int(env, "SPEECH_API_MAX_UPLOAD_MB", 64),
         temp_dir=temp_dir,
-        tts_enabled=_get_bool("SPEECH_TTS_ENABLED", True),
-        tts_max_chars=_get_int("SPEECH_TTS_MAX_CHARS", 4000),
-        piper_bin_path=Path(os.getenv("PIPER_BIN_PATH", "/runtime/piper/piper")).resolve(),
+        tts_enabled=_get_bool(env, "SPEECH_TTS_ENABLED", True),
+        tts_preload=_get_bool(env, "SPEECH_TTS_PRELOAD", True),
+        tts_max_chars=_get_int(env, "SPEECH_TTS_MAX_CHARS", 4000),
+        piper_bin_path=Path(env.get("PIPER_BIN_PATH", "/runtime/piper/piper")).resolve(),
         piper_models_dir=piper_models_dir,
-        piper_default_voice=os.getenv("PIPER_DEFAULT_VOICE", "ru_RU-ruslan-medium").strip(),
-        piper_default_speaker_id=_get_optional_int("PIPER_DEFAULT_SPEAKER_ID"),
-        piper_timeout_seconds=_get_int("PIPER_TIMEOUT_SECONDS", 30),
-        piper_default_length_scale=_get_float("PIPER_DEFAULT_LENGTH_SCALE", 1.0),
-        piper_default_noise_scale=float(os.getenv("PIPER_DEFAULT_NOISE_SCALE")) if os.getenv("PIPER_DEFAULT_NOISE_SCALE") else None,
-        piper_default_noise_w=float(os.getenv("PIPER_DEFAULT_NOISE_W")) if os.getenv("PIPER_DEFAULT_NOISE_W") else None,
-        piper_default_sentence_silence=float(os.getenv("PIPER_DEFAULT_SENTENCE_SILENCE")) if os.getenv("PIPER_DEFAULT_SENTENCE_SILENCE") else None,
-        stt_enabled=_get_bool("SPEECH_STT_ENABLED", True),
-        whisper_model=os.getenv("WHISPER_MODEL", "small").strip(),
-        whisper_device=os.getenv("WHISPER_DEVICE", "cpu").strip(),
-        whisper_compute_type=os.getenv("WHISPER_COMPUTE_TYPE", "int8").strip(),
+        piper_default_voice=env.get("PIPER_DEFAULT_VOICE", "ru_RU-ruslan-medium").strip(),
+        piper_default_speaker_id=_get_optional_int(env, "PIPER_DEFAULT_SPEAKER_ID"),
+        piper_timeout_seconds=_get_int(env, "PIPER_TIMEOUT_SECONDS", 30),
+        piper_max_processes=_get_int(env, "PIPER_MAX_PROCESSES", 2),
+        piper_output_dir=piper_output_dir,
+        piper_default_length_scale=_get_float(env, "PIPER_DEFAULT_LENGTH_SCALE", 1.0),
+        piper_default_noise_scale=_get_optional_float(env, "PIPER_DEFAULT_NOISE_SCALE"),
+        piper_default_noise_w=_get_optional_float(env, "PIPER_DEFAULT_NOISE_W"),
+        piper_default_sentence_silence=_get_optional_float(env, "PIPER_DEFAULT_SENTENCE_SILENCE"),
+        stt_enabled=_get_bool(env, "SPEECH_STT_ENABLED", True),
+        stt_preload=_get_bool(env, "SPEECH_STT_PRELOAD", True),
+        whisper_model=env.get("WHISPER_MODEL", "small").strip(),
+        whisper_device=env.get("WHISPER_DEVICE", "cpu").strip(),
+        whisper_compute_type=env.get("WHISPER_COMPUTE_TYPE", "int8").strip(),
         whisper_models_dir=whisper_models_dir,
-        whisper_cpu_threads=_get_int("WHISPER_CPU_THREADS", 4),
-        whisper_num_workers=_get_int("WHISPER_NUM_WORKERS", 1),
-        stt_default_language=(os.getenv("SPEECH_STT_DEFAULT_LANGUAGE", "").strip() or None),
-        stt_default_task=os.getenv("SPEECH_STT_DEFAULT_TASK", "transcribe").strip(),
-        stt_default_beam_size=_get_int("SPEECH_STT_DEFAULT_BEAM_SIZE", 5),
-        stt_default_vad_filter=_get_bool("SPEECH_STT_DEFAULT_VAD_FILTER", True),
-        stt_default_word_timestamps=_get_bool("SPEECH_STT_DEFAULT_WORD_TIMESTAMPS", False),
-        stt_max_concurrency=_get_int("SPEECH_STT_MAX_CONCURRENCY", 1),
-        stt_timeout_seconds=_get_int("SPEECH_STT_TIMEOUT_SECONDS", 300),
+        whisper_cpu_threads=_get_int(env, "WHISPER_CPU_THREADS", 4),
+        whisper_num_workers=_get_int(env, "WHISPER_NUM_WORKERS", 1),
+        stt_default_language=(env.get("SPEECH_STT_DEFAULT_LANGUAGE", "").strip() or None),
+        stt_default_task=env.get("SPEECH_STT_DEFAULT_TASK", "transcribe").strip(),
+        stt_default_beam_size=_get_int(env, "SPEECH_STT_DEFAULT_BEAM_SIZE", 5),
+        stt_default_vad_filter=_get_bool(env, "SPEECH_STT_DEFAULT_VAD_FILTER", True),
+        stt_default_word_timestamps=_get_bool(env, "SPEECH_STT_DEFAULT_WORD_TIMESTAMPS", False),
+        stt_max_concurrency=_get_int(env, "SPEECH_STT_MAX_CONCURRENCY", 1),
+        stt_max_queue=_get_int(env, "SPEECH_STT_MAX_QUEUE", 8),
+        stt_process_pool=_get_bool(env, "SPEECH_STT_PROCESS_POOL", False),
+        stt_timeout_seconds=_get_int(env, "SPEECH_STT_TIMEOUT_SECONDS", 300),
     )
+
+
+SETTINGS = get_settings()
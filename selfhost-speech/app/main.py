@@ -1,21 +1,33 @@
 from __future__ import annotations
 
 import os
+import sys
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Callable, TypeVar
 
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile, status
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from .audio_utils import save_upload_to_temp_file
-from .config import get_settings
-from .models import ApiInfoResponse, ErrorResponse, TtsSynthesizeRequest
+from .config import SETTINGS
+from .models import (
+    STT_RESPONSE_ADAPTER,
+    ApiInfoResponse,
+    ErrorResponse,
+    SttSegment,
+    SttTranscribeResponse,
+    TtsSynthesizeRequest,
+)
 from .security import require_bearer_token, require_ip_allowlist
 from .stt import FasterWhisperSttService, SttTranscriptionOptions
 from .tts import PiperTtsService
 
-settings = get_settings()
+settings = SETTINGS
 auth_dependency = require_bearer_token(settings)
 ip_allowlist_dependency = require_ip_allowlist(settings)
 
@@ -27,6 +39,35 @@ app = FastAPI(
     openapi_url="/openapi.json" if settings.docs_enabled else None,
 )
 
+max_upload_bytes = max(1, settings.max_upload_mb) * 1024 * 1024
+# Multipart boundaries, part headers and the small form fields ride on top of the file itself.
+multipart_overhead_bytes = 64 * 1024
+UPLOAD_PATHS = frozenset({"/v1/stt/transcribe", "/v1/stt/transcribe/stream"})
+
+
+class RejectOversizeUploadsMiddleware:
+    # Form bodies are parsed before the route runs, so the limit has to be enforced here to avoid spooling them.
+    # Plain ASGI rather than @app.middleware("http"), which would wrap every other request as well.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in UPLOAD_PATHS:
+            content_length = next((value for name, value in scope["headers"] if name == b"content-length"), b"")
+            if content_length.isdigit() and int(content_length) > max_upload_bytes + multipart_overhead_bytes:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"Upload is too large. Limit is {max_upload_bytes // (1024 * 1024)} MB."},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+# Registered before CORS so early rejections still carry CORS headers.
+app.add_middleware(RejectOversizeUploadsMiddleware)
+
+
 if settings.cors_origins:
     app.add_middleware(
         CORSMiddleware,
@@ -39,10 +80,51 @@ if settings.cors_origins:
 tts_service = PiperTtsService(settings)
 stt_service = FasterWhisperSttService(settings)
 
+T = TypeVar("T")
+PROBE_CACHE_TTL_SECONDS = 5.0
+_probe_cache: dict[str, tuple[float, object]] = {}
+
+
+def _cached_probe(name: str, probe: Callable[[], T]) -> T:
+    # Health endpoints get polled every few seconds; re-run filesystem probes at most once per TTL.
+    now = time.monotonic()
+    cached = _probe_cache.get(name)
+    if cached is not None and now - cached[0] < PROBE_CACHE_TTL_SECONDS:
+        return cached[1]  # type: ignore[return-value]
+    value = probe()
+    _probe_cache[name] = (now, value)
+    return value
+
+
+def _apply_cpu_thread_caps() -> None:
+    # Has to run before faster-whisper loads CTranslate2 and its OpenMP runtime; explicit env values win.
+    threads = str(max(1, settings.whisper_cpu_threads))
+    os.environ.setdefault("OMP_NUM_THREADS", threads)
+    os.environ.setdefault("MKL_NUM_THREADS", threads)
+    os.environ.setdefault("CT2_VERBOSE", "0")
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(int(threads))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only allowed before torch has started any inter-op work.
+            pass
+
 
 @app.on_event("startup")
 async def _startup() -> None:
+    _apply_cpu_thread_caps()
     settings.temp_dir.mkdir(parents=True, exist_ok=True)
+    await tts_service.preload()
+    await stt_service.preload()
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    await tts_service.close()
+    await stt_service.close()
 
 
 @app.get("/healthz")
@@ -50,13 +132,13 @@ async def healthz(_: None = Depends(ip_allowlist_dependency)) -> dict[str, objec
     if not settings.allow_unauth_health and settings.api_token:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found.")
 
-    tts_issues = tts_service.validate_environment()
+    tts_issues = _cached_probe("tts_issues", tts_service.validate_environment)
     return {
         "ok": True,
         "tts_enabled": settings.tts_enabled,
         "stt_enabled": settings.stt_enabled,
-        "tts_ready": tts_service.is_ready(),
-        "stt_ready": stt_service.is_ready(),
+        "tts_ready": _cached_probe("tts_ready", tts_service.is_ready),
+        "stt_ready": _cached_probe("stt_ready", stt_service.is_ready),
         "tts_issues": tts_issues,
         "ip_allowlist_configured": bool(settings.ip_allowlist),
         "temp_dir": str(settings.temp_dir),
@@ -69,7 +151,9 @@ async def healthz(_: None = Depends(ip_allowlist_dependency)) -> dict[str, objec
     dependencies=[Depends(ip_allowlist_dependency), Depends(auth_dependency)],
 )
 async def info() -> ApiInfoResponse:
-    ready = (not settings.tts_enabled or tts_service.is_ready()) and (not settings.stt_enabled or stt_service.is_ready())
+    ready = (not settings.tts_enabled or _cached_probe("tts_ready", tts_service.is_ready)) and (
+        not settings.stt_enabled or _cached_probe("stt_ready", stt_service.is_ready)
+    )
     return ApiInfoResponse(
         service="controledu-selfhost-speech",
         tts_enabled=settings.tts_enabled,
@@ -104,14 +188,35 @@ async def list_voices() -> dict[str, object]:
     dependencies=[Depends(ip_allowlist_dependency), Depends(auth_dependency)],
 )
 async def synthesize_tts(request: TtsSynthesizeRequest) -> Response:
-    audio = await tts_service.synthesize(request)
-    return Response(content=audio, media_type="audio/wav")
+    wav_path = await tts_service.synthesize(request)
+    # Streamed from the file and removed once sent, instead of holding the whole WAV as bytes.
+    return FileResponse(wav_path, media_type="audio/wav", background=BackgroundTask(wav_path.unlink, missing_ok=True))
+
+
+def _transcription_options(
+    language: str | None,
+    task: str | None,
+    beam_size: int | None,
+    vad_filter: bool | None,
+    word_timestamps: bool | None,
+) -> SttTranscriptionOptions:
+    normalized_language = (language or settings.stt_default_language or "").strip() or None
+    if normalized_language and normalized_language.lower() == "auto":
+        normalized_language = None
+
+    return SttTranscriptionOptions(
+        language=normalized_language,
+        task=(task or settings.stt_default_task or "transcribe"),
+        beam_size=beam_size if beam_size is not None else settings.stt_default_beam_size,
+        vad_filter=vad_filter if vad_filter is not None else settings.stt_default_vad_filter,
+        word_timestamps=(word_timestamps if word_timestamps is not None else settings.stt_default_word_timestamps),
+    )
 
 
 @app.post(
     "/v1/stt/transcribe",
     responses={
-        200: {},
+        200: {"model": SttTranscribeResponse},
         400: {"model": ErrorResponse},
         401: {"model": ErrorResponse},
         413: {"model": ErrorResponse},
@@ -127,35 +232,98 @@ async def transcribe_stt(
     beam_size: Annotated[int | None, Form()] = None,
     vad_filter: Annotated[bool | None, Form()] = None,
     word_timestamps: Annotated[bool | None, Form()] = None,
-) -> JSONResponse:
-    max_bytes = max(1, settings.max_upload_mb) * 1024 * 1024
+) -> Response:
     temp_path: Path | None = None
     try:
-        temp_path = await save_upload_to_temp_file(file, settings.temp_dir, max_bytes=max_bytes)
-        normalized_language = (language or settings.stt_default_language or "").strip() or None
-        if normalized_language and normalized_language.lower() == "auto":
-            normalized_language = None
-
+        # Still enforced while copying: chunked requests carry no Content-Length.
+        temp_path = await save_upload_to_temp_file(file, settings.temp_dir, max_bytes=max_upload_bytes)
         result = await stt_service.transcribe_file(
             temp_path,
-            SttTranscriptionOptions(
-                language=normalized_language,
-                task=(task or settings.stt_default_task or "transcribe"),
-                beam_size=beam_size if beam_size is not None else settings.stt_default_beam_size,
-                vad_filter=vad_filter if vad_filter is not None else settings.stt_default_vad_filter,
-                word_timestamps=(
-                    word_timestamps if word_timestamps is not None else settings.stt_default_word_timestamps
-                ),
-            ),
+            _transcription_options(language, task, beam_size, vad_filter, word_timestamps),
         )
-        return JSONResponse(content=result.model_dump())
+        content = STT_RESPONSE_ADAPTER.dump_json(result)
+    except BaseException:
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+        raise
     finally:
         await file.close()
+
+    # On success the temp file is removed after the response has been sent.
+    return Response(
+        content=content,
+        media_type="application/json",
+        background=BackgroundTask(temp_path.unlink, missing_ok=True),
+    )
+
+
+async def _stream_segments(
+    request: Request,
+    first: SttSegment,
+    rest: AsyncGenerator[SttSegment, None],
+) -> AsyncIterator[bytes]:
+    try:
+        yield first.model_dump_json().encode("utf-8") + b"\n"
+        async for segment in rest:
+            # Writes to a closed connection are dropped silently, so ask before each segment;
+            # closing `rest` stops the decoder at the next segment boundary and frees its STT slot.
+            if await request.is_disconnected():
+                break
+            yield segment.model_dump_json().encode("utf-8") + b"\n"
+    except HTTPException as exc:
+        # The status line is already sent; report a late failure as a final error line.
+        yield ErrorResponse(detail=str(exc.detail)).model_dump_json().encode("utf-8") + b"\n"
+    finally:
+        await rest.aclose()
+
+
+@app.post(
+    "/v1/stt/transcribe/stream",
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One JSON segment per line."},
+        400: {"model": ErrorResponse},
+        401: {"model": ErrorResponse},
+        413: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+        504: {"model": ErrorResponse},
+    },
+    dependencies=[Depends(ip_allowlist_dependency), Depends(auth_dependency)],
+)
+async def transcribe_stt_stream(
+    request: Request,
+    file: Annotated[UploadFile, File(description="Audio file (wav/mp3/m4a/ogg/flac, ffmpeg required for non-wav).")],
+    language: Annotated[str | None, Form()] = None,
+    task: Annotated[str | None, Form()] = None,
+    beam_size: Annotated[int | None, Form()] = None,
+    vad_filter: Annotated[bool | None, Form()] = None,
+    word_timestamps: Annotated[bool | None, Form()] = None,
+) -> Response:
+    temp_path: Path | None = None
+    segments: AsyncGenerator[SttSegment, None] | None = None
+    try:
+        temp_path = await save_upload_to_temp_file(file, settings.temp_dir, max_bytes=max_upload_bytes)
+        segments = stt_service.transcribe_file_stream(
+            temp_path,
+            _transcription_options(language, task, beam_size, vad_filter, word_timestamps),
+        )
+        # Wait for the first segment so failures before any output still get a proper status code.
+        try:
+            first = await anext(segments)
+        except StopAsyncIteration:
+            first = None
+    except BaseException:
+        if segments is not None:
+            await segments.aclose()
         if temp_path is not None:
-            try:
-                os.remove(temp_path)
-            except FileNotFoundError:
-                pass
+            temp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        await file.close()
+
+    cleanup = BackgroundTask(temp_path.unlink, missing_ok=True)
+    if first is None:
+        return Response(content=b"", media_type="application/x-ndjson", background=cleanup)
+    return StreamingResponse(_stream_segments(request, first, segments), media_type="application/x-ndjson", background=cleanup)
 
 
 if __name__ == "__main__":
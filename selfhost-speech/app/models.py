@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Literal
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 
 
 class ErrorResponse(BaseModel):
@@ -22,6 +22,9 @@ class TtsSynthesizeRequest(BaseModel):
     @field_validator("text")
     @classmethod
     def strip_text(cls, value: str) -> str:
+        # Already-trimmed text (the usual case) skips the strip entirely.
+        if value and not value[0].isspace() and not value[-1].isspace():
+            return value
         stripped = value.strip()
         if not stripped:
             raise ValueError("Text must not be empty.")
@@ -57,6 +60,10 @@ class SttTranscribeResponse(BaseModel):
     segments: list[SttSegment]
 
 
+# Built once: serializing straight to JSON bytes skips the intermediate dict of model_dump().
+STT_RESPONSE_ADAPTER = TypeAdapter(SttTranscribeResponse)
+
+
 class ApiInfoResponse(BaseModel):
     service: str
     tts_enabled: bool
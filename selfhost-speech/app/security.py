@@ -1,18 +1,30 @@
 from __future__ import annotations
 
-from ipaddress import ip_address, ip_network
+import hmac
+import socket
+from bisect import bisect_right
+from ipaddress import IPv4Network, IPv6Network, ip_network
 
 from fastapi import Header, HTTPException, Request, status
 
 from .config import Settings
 
+try:
+    import pytricia  # Optional C extension for longest-prefix matching.
+except ImportError:  # pragma: no cover
+    pytricia = None
+
 
 def require_bearer_token(settings: Settings):
-    async def _dependency(authorization: str | None = Header(default=None, alias="Authorization")) -> None:
-        expected = settings.api_token.strip()
-        if not expected:
+    expected = settings.api_token.strip().encode("utf-8")
+    if not expected:
+
+        async def _no_auth() -> None:
             return
 
+        return _no_auth
+
+    async def _dependency(authorization: str | None = Header(default=None, alias="Authorization")) -> None:
         if not authorization or not authorization.startswith("Bearer "):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,8 +32,9 @@ def require_bearer_token(settings: Settings):
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        actual = authorization[len("Bearer ") :].strip()
-        if actual != expected:
+        actual = authorization[len("Bearer ") :].strip().encode("utf-8")
+        # Constant-time compare so response timing does not reveal how much of the token matched.
+        if not hmac.compare_digest(actual, expected):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid bearer token.",
@@ -31,6 +44,22 @@ def require_bearer_token(settings: Settings):
     return _dependency
 
 
+def _merged_ranges(networks: list[IPv4Network | IPv6Network], version: int) -> tuple[list[int], list[int]]:
+    # Overlapping networks are merged so a single bisect finds the only interval that can contain an address.
+    intervals = sorted(
+        (int(net.network_address), int(net.broadcast_address)) for net in networks if net.version == version
+    )
+    lows: list[int] = []
+    highs: list[int] = []
+    for low, high in intervals:
+        if highs and low <= highs[-1] + 1:
+            highs[-1] = max(highs[-1], high)
+        else:
+            lows.append(low)
+            highs.append(high)
+    return lows, highs
+
+
 def require_ip_allowlist(settings: Settings):
     networks = []
     for raw in settings.ip_allowlist:
@@ -43,20 +72,44 @@ def require_ip_allowlist(settings: Settings):
         except ValueError:
             continue
 
-    async def _dependency(request: Request) -> None:
-        if not networks:
+    if not networks:
+
+        async def _no_allowlist() -> None:
             return
 
+        return _no_allowlist
+
+    # One trie per family: a shared 128-bit trie would let IPv6 clients match IPv4 prefixes by their leading bits.
+    tries = {4: pytricia.PyTricia(32), 6: pytricia.PyTricia(128)} if pytricia is not None else None
+    if tries is not None:
+        for net in networks:
+            tries[net.version][str(net)] = True
+
+    ranges = {version: _merged_ranges(networks, version) for version in (4, 6)}
+
+    async def _dependency(request: Request) -> None:
         client_host = request.client.host if request.client else None
         if not client_host:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client IP is unavailable.")
 
+        version = 6 if ":" in client_host else 4
+        if tries is not None:
+            try:
+                if tries[version].get(client_host) is not None:
+                    return
+            except ValueError as exc:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid client IP.") from exc
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client IP is not allowed.")
+
+        family = socket.AF_INET6 if version == 6 else socket.AF_INET
         try:
-            client_ip = ip_address(client_host)
-        except ValueError as exc:
+            client_value = int.from_bytes(socket.inet_pton(family, client_host), "big")
+        except (OSError, ValueError) as exc:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid client IP.") from exc
 
-        if any(client_ip in net for net in networks):
+        lows, highs = ranges[version]
+        index = bisect_right(lows, client_value) - 1
+        if index >= 0 and client_value <= highs[index]:
             return
 
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client IP is not allowed.")
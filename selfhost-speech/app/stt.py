@@ -1,7 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import multiprocessing
+import tempfile
 import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections.abc import AsyncGenerator
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
@@ -11,6 +18,11 @@ from fastapi import HTTPException, status
 from .config import Settings
 from .models import SttSegment, SttTranscribeResponse, SttWord
 
+logger = logging.getLogger(__name__)
+
+WARMUP_SAMPLE_RATE = 16000
+WARMUP_SECONDS = 0.1
+
 
 @dataclass(frozen=True)
 class SttTranscriptionOptions:
@@ -27,6 +39,9 @@ class FasterWhisperSttService:
         self._model: Any | None = None
         self._model_lock = threading.Lock()
         self._semaphore = asyncio.Semaphore(max(1, settings.stt_max_concurrency))
+        self._waiting = 0
+        self._pool_size = max(1, settings.stt_max_concurrency)
+        self._executor: ProcessPoolExecutor | None = None
 
     def is_ready(self) -> bool:
         return self._settings.stt_enabled
@@ -58,91 +73,228 @@ class FasterWhisperSttService:
             )
             return self._model
 
-    async def transcribe_file(self, audio_path: Path, options: SttTranscriptionOptions) -> SttTranscribeResponse:
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned rather than forked: the parent already runs an event loop and worker threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._settings,),
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor | None) -> None:
+        # Only the pool the failed job ran on: a concurrent failure must not tear down its fresh replacement.
+        if executor is None or self._executor is not executor:
+            return
+        self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_to_pool(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        audio_path: Path,
+        options: SttTranscriptionOptions,
+    ) -> tuple[ProcessPoolExecutor, asyncio.Future]:
+        executor = self._get_executor()
+        try:
+            return executor, loop.run_in_executor(executor, _transcribe_in_worker, audio_path, options)
+        except BrokenProcessPool:
+            # A worker that died while idle only surfaces at submit time; retry once on a fresh pool.
+            self._discard_executor(executor)
+        executor = self._get_executor()
+        try:
+            return executor, loop.run_in_executor(executor, _transcribe_in_worker, audio_path, options)
+        except BrokenProcessPool as exc:
+            self._discard_executor(executor)
+            raise _worker_failed_error() from exc
+
+    async def close(self) -> None:
+        self._discard_executor(self._executor)
+
+    async def preload(self) -> None:
+        if not self._settings.stt_enabled or not self._settings.stt_preload:
+            return
+        try:
+            if self._settings.stt_process_pool:
+                # One warmup per worker; the pool starts a new process for each task while none are idle.
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor()
+                await asyncio.gather(
+                    *(loop.run_in_executor(executor, _warmup_in_worker) for _ in range(self._pool_size))
+                )
+                return
+            model = await asyncio.to_thread(self._get_model)
+            await asyncio.to_thread(self._warmup_sync, model)
+        except Exception as exc:
+            # The first request retries the load, so a failed preload only costs the old lazy behaviour.
+            detail = exc.detail if isinstance(exc, HTTPException) else exc
+            logger.warning("STT preload failed: %s", detail)
+
+    def _warmup_sync(self, model) -> None:
+        # A short silent clip runs the decode + inference path once so the first real request is not cold.
+        self._settings.temp_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self._settings.temp_dir, suffix=".wav", delete=False) as handle:
+            silence_path = Path(handle.name)
+        try:
+            with wave.open(str(silence_path), "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(WARMUP_SAMPLE_RATE)
+                wav.writeframes(b"\x00\x00" * int(WARMUP_SAMPLE_RATE * WARMUP_SECONDS))
+            segments_iter, _ = model.transcribe(str(silence_path), beam_size=1, vad_filter=False)
+            # Segments are decoded lazily; drain them so the warmup actually runs inference.
+            for _ in segments_iter:
+                pass
+        finally:
+            silence_path.unlink(missing_ok=True)
+
+    def _check_request(self, options: SttTranscriptionOptions) -> None:
         if not self._settings.stt_enabled:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="STT is disabled.")
 
         if options.task not in {"transcribe", "translate"}:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="task must be transcribe or translate.")
 
-        model = self._get_model()
+    async def _acquire_slot(self) -> None:
+        # Bounded wait queue: reject early instead of piling up uploads behind a busy model.
+        if self._semaphore.locked() and self._waiting >= max(0, self._settings.stt_max_queue):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="STT is busy, try again later.",
+            )
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
 
-        async with self._semaphore:
+    def _release_slot_when_done(self, future: asyncio.Future) -> None:
+        # The slot stays taken until the worker really finishes, even if the request has already given up on it.
+        def _done(done: asyncio.Future) -> None:
+            self._semaphore.release()
+            if not done.cancelled():
+                done.exception()  # Mark as retrieved; abandoned results are simply dropped.
+
+        future.add_done_callback(_done)
+
+    async def transcribe_file(self, audio_path: Path, options: SttTranscriptionOptions) -> SttTranscribeResponse:
+        self._check_request(options)
+        model = None if self._settings.stt_process_pool else self._get_model()
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+
+        executor: ProcessPoolExecutor | None = None
+        await self._acquire_slot()
+        try:
+            if model is None:
+                # Worker processes cannot see the stop flag; a timed-out job there runs to completion.
+                executor, future = self._submit_to_pool(loop, audio_path, options)
+            else:
+                future = loop.run_in_executor(None, self._transcribe_sync, model, audio_path, options, stop)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._release_slot_when_done(future)
+
+        try:
+            # Shielded: cancelling the wrapper would release the slot while the thread keeps running.
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self._settings.stt_timeout_seconds)
+        except HTTPException:
+            raise
+        except BrokenProcessPool as exc:
+            # A worker died (e.g. out of memory or a failed model load); start a fresh pool next time.
+            self._discard_executor(executor)
+            raise _worker_failed_error() from exc
+        except TimeoutError as exc:
+            stop.set()
+            raise _timeout_error() from exc
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+        except Exception as exc:
+            raise _transcription_error(exc) from exc
+
+        return result
+
+    async def transcribe_file_stream(
+        self,
+        audio_path: Path,
+        options: SttTranscriptionOptions,
+    ) -> AsyncGenerator[SttSegment, None]:
+        # Streaming always decodes in this process: segments have to be handed over as they are produced.
+        # With the process pool that model is only loaded here, so keep the (possibly downloading) load off the loop.
+        self._check_request(options)
+        model = self._model if self._model is not None else await asyncio.to_thread(self._get_model)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[object] = asyncio.Queue()
+        stop = threading.Event()
+
+        def publish(item: object) -> None:
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def produce() -> None:
             try:
-                result = await asyncio.wait_for(
-                    asyncio.to_thread(self._transcribe_sync, model, audio_path, options),
-                    timeout=self._settings.stt_timeout_seconds,
-                )
-            except HTTPException:
-                raise
-            except TimeoutError as exc:
-                raise HTTPException(
-                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
-                    detail="STT transcription timed out.",
-                ) from exc
+                segments_iter, _ = _start_transcription(model, audio_path, options)
+                for index, segment in enumerate(segments_iter):
+                    # Checked between segments, so an abandoned stream stops decoding at the next boundary.
+                    if stop.is_set():
+                        return
+                    publish(_to_stt_segment(index, segment, options.word_timestamps))
             except Exception as exc:
-                message = str(exc)
-                if "Invalid data found when processing input" in message:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=(
-                            "Invalid audio input: decoder could not parse the uploaded file. "
-                            "This often happens when a browser MediaRecorder fragment is sent as a standalone WebM chunk."
-                        ),
-                    ) from exc
+                publish(exc)
+            finally:
+                publish(_STREAM_DONE)
 
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"STT transcription failed: {message}",
-                ) from exc
+        await self._acquire_slot()
+        try:
+            producer = loop.run_in_executor(None, produce)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._release_slot_when_done(producer)
 
-        return result
+        deadline = loop.time() + self._settings.stt_timeout_seconds
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - loop.time()))
+                except TimeoutError as exc:
+                    raise _timeout_error() from exc
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise _transcription_error(item) from item
+                yield item  # type: ignore[misc]
+        finally:
+            stop.set()
 
-    def _transcribe_sync(self, model, audio_path: Path, options: SttTranscriptionOptions) -> SttTranscribeResponse:
-        segments_iter, info = model.transcribe(
-            str(audio_path),
-            language=options.language,
-            task=options.task,
-            beam_size=max(1, options.beam_size),
-            vad_filter=options.vad_filter,
-            word_timestamps=options.word_timestamps,
-        )
+    def _transcribe_sync(
+        self,
+        model,
+        audio_path: Path,
+        options: SttTranscriptionOptions,
+        stop: threading.Event | None = None,
+    ) -> SttTranscribeResponse:
+        segments_iter, info = _start_transcription(model, audio_path, options)
 
         segments: list[SttSegment] = []
         full_text_parts: list[str] = []
 
         for index, segment in enumerate(segments_iter):
-            text = (getattr(segment, "text", "") or "").strip()
-            if text:
-                full_text_parts.append(text)
-
-            words = None
-            if options.word_timestamps and getattr(segment, "words", None):
-                words = [
-                    SttWord(
-                        start=getattr(word, "start", None),
-                        end=getattr(word, "end", None),
-                        word=(getattr(word, "word", "") or "").strip(),
-                        probability=getattr(word, "probability", None),
-                    )
-                    for word in segment.words
-                ]
-
-            segments.append(
-                SttSegment(
-                    id=index,
-                    start=float(getattr(segment, "start", 0.0) or 0.0),
-                    end=float(getattr(segment, "end", 0.0) or 0.0),
-                    text=text,
-                    avg_logprob=getattr(segment, "avg_logprob", None),
-                    no_speech_prob=getattr(segment, "no_speech_prob", None),
-                    compression_ratio=getattr(segment, "compression_ratio", None),
-                    words=words,
-                )
-            )
+            # Segments come out of a lazy generator, so this is where a timed-out request stops decoding.
+            if stop is not None and stop.is_set():
+                raise _TranscriptionStopped()
+            stt_segment = _to_stt_segment(index, segment, options.word_timestamps)
+            if stt_segment.text:
+                full_text_parts.append(stt_segment.text)
+            segments.append(stt_segment)
 
         return SttTranscribeResponse(
-            text=" ".join(part for part in full_text_parts if part).strip(),
+            # Parts are already stripped and non-empty, so a plain join needs no filtering or strip.
+            text=" ".join(full_text_parts),
             language=getattr(info, "language", None),
             language_probability=getattr(info, "language_probability", None),
             duration=getattr(info, "duration", None),
@@ -151,3 +303,102 @@ class FasterWhisperSttService:
             task=options.task,
             segments=segments,
         )
+
+
+_STREAM_DONE = object()
+
+
+class _TranscriptionStopped(Exception):
+    pass
+
+
+def _start_transcription(model, audio_path: Path, options: SttTranscriptionOptions):
+    return model.transcribe(
+        str(audio_path),
+        language=options.language,
+        task=options.task,
+        beam_size=max(1, options.beam_size),
+        vad_filter=options.vad_filter,
+        word_timestamps=options.word_timestamps,
+    )
+
+
+def _to_stt_segment(index: int, segment, word_timestamps: bool) -> SttSegment:
+    # faster-whisper's Segment and Word are NamedTuples, so every field is always present.
+    words = None
+    if word_timestamps and segment.words:
+        words = [
+            SttWord(
+                start=word.start,
+                end=word.end,
+                word=(word.word or "").strip(),
+                probability=word.probability,
+            )
+            for word in segment.words
+        ]
+
+    return SttSegment(
+        id=index,
+        start=float(segment.start or 0.0),
+        end=float(segment.end or 0.0),
+        text=(segment.text or "").strip(),
+        avg_logprob=segment.avg_logprob,
+        no_speech_prob=segment.no_speech_prob,
+        compression_ratio=segment.compression_ratio,
+        words=words,
+    )
+
+
+def _timeout_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail="STT transcription timed out.",
+    )
+
+
+def _worker_failed_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="STT worker process failed.",
+    )
+
+
+def _transcription_error(exc: Exception) -> HTTPException:
+    message = str(exc)
+    if "Invalid data found when processing input" in message:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                "Invalid audio input: decoder could not parse the uploaded file. "
+                "This often happens when a browser MediaRecorder fragment is sent as a standalone WebM chunk."
+            ),
+        )
+
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"STT transcription failed: {message}",
+    )
+
+
+# Process-pool workers each hold their own service instance and model.
+_worker_service: FasterWhisperSttService | None = None
+
+
+def _init_worker(settings: Settings) -> None:
+    global _worker_service
+    _worker_service = FasterWhisperSttService(settings)
+    _worker_service._get_model()
+
+
+def _warmup_in_worker() -> None:
+    assert _worker_service is not None
+    _worker_service._warmup_sync(_worker_service._get_model())
+
+
+def _transcribe_in_worker(audio_path: Path, options: SttTranscriptionOptions) -> SttTranscribeResponse:
+    assert _worker_service is not None
+    try:
+        return _worker_service._transcribe_sync(_worker_service._get_model(), audio_path, options)
+    except Exception as exc:
+        # Decoder exceptions do not always survive pickling; the message is all the parent inspects.
+        raise RuntimeError(str(exc)) from None
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import logging
+import os
 import shutil
+import stat
 import subprocess
-import tempfile
+import time
+import uuid
+from collections import OrderedDict, deque
 from pathlib import Path
 
 from fastapi import HTTPException, status
@@ -11,6 +17,14 @@ from fastapi import HTTPException, status
 from .config import Settings
 from .models import TtsSynthesizeRequest
 
+logger = logging.getLogger(__name__)
+
+STDERR_TAIL_LINES = 20
+WAV_READ_ATTEMPTS = 50
+WAV_READ_RETRY_SECONDS = 0.01
+PATH_CACHE_TTL_SECONDS = 60.0
+MODEL_PATH_CACHE_MAX_ENTRIES = 256
+
 
 def _safe_voice_name(raw: str) -> str:
     name = raw.strip()
@@ -21,26 +35,240 @@ def _safe_voice_name(raw: str) -> str:
     return name.replace(".onnx", "")
 
 
+def _make_private_dir(path: Path) -> bool:
+    # Create, then verify what is actually there: in a shared directory like /dev/shm another local user
+    # may already have created (or symlinked) the same name.
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            return False
+        if stat.S_IMODE(info.st_mode) != 0o700:
+            os.chmod(path, 0o700)
+    except OSError:
+        return False
+    return True
+
+
+def _wav_is_complete(path: Path) -> bool:
+    try:
+        with path.open("rb") as handle:
+            header = handle.read(8)
+            size = os.fstat(handle.fileno()).st_size
+    except FileNotFoundError:
+        return False
+    return len(header) == 8 and header[:4] == b"RIFF" and size >= int.from_bytes(header[4:8], "little") + 8
+
+
+async def _wait_for_complete_wav(path: Path) -> bool:
+    # Piper reports the path as soon as it has written the audio, which can be just before its file stream is flushed.
+    for _ in range(WAV_READ_ATTEMPTS):
+        if _wav_is_complete(path):
+            return True
+        await asyncio.sleep(WAV_READ_RETRY_SECONDS)
+    return False
+
+
+def _build_synthesis_args(
+    length_scale: float | None,
+    noise_scale: float | None,
+    noise_w: float | None,
+    sentence_silence: float | None,
+) -> tuple[str, ...]:
+    args: list[str] = []
+    if length_scale and length_scale > 0:
+        args.extend(["--length-scale", str(length_scale)])
+    if noise_scale is not None:
+        args.extend(["--noise-scale", str(noise_scale)])
+    if noise_w is not None:
+        args.extend(["--noise_w", str(noise_w)])
+    if sentence_silence is not None:
+        args.extend(["--sentence-silence", str(sentence_silence)])
+    return tuple(args)
+
+
+# A long-lived `piper --json-input` process that keeps its voice model loaded between requests.
+class _PiperProcess:
+    def __init__(self, command: tuple[str, ...]) -> None:
+        self.command = command
+        self.lock = asyncio.Lock()
+        # Requests holding or waiting for `lock`; the service never retires a process while this is non-zero.
+        self.users = 0
+        self._process: asyncio.subprocess.Process | None = None
+        self._stderr_task: asyncio.Task[None] | None = None
+        self._stderr_tail: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+
+    async def _start(self) -> asyncio.subprocess.Process:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Failed to start Piper binary: {exc}",
+            ) from exc
+        self._stderr_tail.clear()
+        self._stderr_task = asyncio.create_task(self._drain_stderr(process))
+        self._process = process
+        return process
+
+    async def _drain_stderr(self, process: asyncio.subprocess.Process) -> None:
+        # Piper logs every utterance; keep reading so the pipe never fills up and blocks it.
+        assert process.stderr is not None
+        async for line in process.stderr:
+            text = line.decode("utf-8", errors="ignore").strip()
+            if text:
+                self._stderr_tail.append(text)
+
+    @staticmethod
+    async def _exchange(process: asyncio.subprocess.Process, line: bytes) -> bytes:
+        assert process.stdin is not None and process.stdout is not None
+        process.stdin.write(line)
+        await process.stdin.drain()
+        # Piper prints the path of each WAV it writes, which marks the end of the utterance.
+        return await process.stdout.readline()
+
+    async def acquire(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self.lock.acquire(), timeout=timeout)
+        except TimeoutError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Piper TTS is busy, try again later.",
+            ) from exc
+
+    async def synthesize(self, payload: dict[str, object], timeout: float) -> None:
+        # Callers must hold `lock`: the process handles one utterance at a time.
+        process = self._process
+        if process is None or process.returncode is not None:
+            # Started on first use and restarted here after a crash.
+            process = await self._start()
+
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        try:
+            reply = await asyncio.wait_for(self._exchange(process, line), timeout=timeout)
+        except TimeoutError as exc:
+            await self.close()
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Piper TTS timed out.",
+            ) from exc
+        except (BrokenPipeError, ConnectionResetError):
+            reply = b""
+        except asyncio.CancelledError:
+            # The reply would otherwise be picked up by the next request in line.
+            self._kill()
+            raise
+
+        reply_path = reply.decode("utf-8", errors="ignore").strip()
+        if not reply_path:
+            await self.close()
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Piper failed ({process.returncode}). {self.stderr_text() or 'No error output.'}",
+            )
+        if reply_path != payload["output_file"]:
+            # Anything else on stdout means the exchange is out of step; never use (or delete) that path.
+            await self.close()
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Piper reported an unexpected output file.",
+            )
+
+    def stderr_text(self) -> str:
+        return " ".join(self._stderr_tail)
+
+    def _kill(self) -> None:
+        process, self._process = self._process, None
+        if process is not None and process.returncode is None:
+            process.kill()
+
+    async def close(self) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        if self._stderr_task is not None:
+            await self._stderr_task
+            self._stderr_task = None
+
+
 class PiperTtsService:
     def __init__(self, settings: Settings) -> None:
         self._settings = settings
+        self._processes: OrderedDict[tuple[str, ...], _PiperProcess] = OrderedDict()
+        # Only positive lookups are cached, so a binary or voice that shows up later is noticed immediately.
+        self._bin_seen_at: float | None = None
+        self._model_paths: dict[str, tuple[float, Path]] = {}
+        self._output_dir: Path | None = None
+        self._voices_cache: tuple[int, list[str]] | None = None
+        # Most requests use the configured defaults, so their flags are formatted once.
+        self._default_synthesis_args = _build_synthesis_args(
+            settings.piper_default_length_scale,
+            settings.piper_default_noise_scale,
+            settings.piper_default_noise_w,
+            settings.piper_default_sentence_silence,
+        )
 
     def is_ready(self) -> bool:
         if not self._settings.tts_enabled:
             return False
-        if not self._settings.piper_bin_path.exists():
+        if not self._piper_bin_exists():
             return False
         try:
-            model_path = self._resolve_model_path(self._settings.piper_default_voice)
+            _, exists = self._lookup_model(self._settings.piper_default_voice)
         except ValueError:
             return False
-        return model_path.exists()
+        return exists
+
+    def _piper_bin_exists(self) -> bool:
+        now = time.monotonic()
+        if self._bin_seen_at is not None and now - self._bin_seen_at < PATH_CACHE_TTL_SECONDS:
+            return True
+        if not self._settings.piper_bin_path.exists():
+            return False
+        self._bin_seen_at = now
+        return True
 
     def _resolve_model_path(self, voice: str | None) -> Path:
         selected = _safe_voice_name(voice or self._settings.piper_default_voice)
         return (self._settings.piper_models_dir / f"{selected}.onnx").resolve()
 
-    async def synthesize(self, request: TtsSynthesizeRequest) -> bytes:
+    def _lookup_model(self, voice: str | None) -> tuple[Path, bool]:
+        # Keyed by the normalized name, so spellings like " v1" or "v1.onnx" share one entry.
+        key = _safe_voice_name(voice or self._settings.piper_default_voice)
+        now = time.monotonic()
+        cached = self._model_paths.get(key)
+        if cached is not None and now - cached[0] < PATH_CACHE_TTL_SECONDS:
+            return cached[1], True
+        model_path = self._resolve_model_path(key)
+        exists = model_path.is_file()
+        if exists:
+            # Case-insensitive filesystems still accept many spellings of one voice; keep the cache bounded.
+            if len(self._model_paths) >= MODEL_PATH_CACHE_MAX_ENTRIES and key not in self._model_paths:
+                self._model_paths.clear()
+            self._model_paths[key] = (now, model_path)
+        return model_path, exists
+
+    async def preload(self) -> None:
+        if not self._settings.tts_preload or not self.is_ready():
+            return
+        try:
+            # Starts the default voice's Piper process and runs one utterance so ONNX Runtime is warm.
+            wav_path = await self.synthesize(TtsSynthesizeRequest(text="a"))
+            wav_path.unlink(missing_ok=True)
+        except Exception as exc:
+            detail = exc.detail if isinstance(exc, HTTPException) else exc
+            logger.warning("TTS preload failed: %s", detail)
+
+    async def synthesize(self, request: TtsSynthesizeRequest) -> Path:
+        # Returns the finished WAV; the caller owns the file and must delete it.
         if not self._settings.tts_enabled:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="TTS is disabled.")
 
@@ -50,126 +278,174 @@ class PiperTtsService:
                 detail=f"TTS text too long. Max {self._settings.tts_max_chars} characters.",
             )
 
-        if not self._settings.piper_bin_path.exists():
+        if not self._piper_bin_exists():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Piper binary not found at {self._settings.piper_bin_path}.",
             )
 
         try:
-            model_path = self._resolve_model_path(request.voice)
+            model_path, model_exists = self._lookup_model(request.voice)
         except ValueError as exc:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-        if not model_path.exists():
+        if not model_exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Piper voice model not found: {model_path.name}",
             )
 
-        with tempfile.TemporaryDirectory(prefix="controledu-piper-") as temp_dir:
-            temp_dir_path = Path(temp_dir)
-            output_file = temp_dir_path / "tts.wav"
-            input_file = temp_dir_path / "input.txt"
-            input_file.write_text(request.text, encoding="utf-8")
-
-            command = [
-                str(self._settings.piper_bin_path),
-                "-m",
-                str(model_path),
-                "-i",
-                str(input_file),
-                "-f",
-                str(output_file),
-            ]
-
-            speaker_id = request.speaker_id if request.speaker_id is not None else self._settings.piper_default_speaker_id
-            if speaker_id is not None:
-                command.extend(["--speaker", str(speaker_id)])
-
-            length_scale = request.length_scale if request.length_scale is not None else self._settings.piper_default_length_scale
-            if length_scale and length_scale > 0:
-                command.extend(["--length-scale", str(length_scale)])
-
-            noise_scale = request.noise_scale if request.noise_scale is not None else self._settings.piper_default_noise_scale
-            if noise_scale is not None:
-                command.extend(["--noise-scale", str(noise_scale)])
-
-            noise_w = request.noise_w if request.noise_w is not None else self._settings.piper_default_noise_w
-            if noise_w is not None:
-                command.extend(["--noise_w", str(noise_w)])
-
-            sentence_silence = (
-                request.sentence_silence
-                if request.sentence_silence is not None
-                else self._settings.piper_default_sentence_silence
-            )
-            if sentence_silence is not None:
-                command.extend(["--sentence-silence", str(sentence_silence)])
-
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                )
-            except FileNotFoundError as exc:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail=f"Failed to start Piper binary: {exc}",
-                ) from exc
+        output_dir = self._output_dir or self._prepare_output_dir()
+        command = (
+            str(self._settings.piper_bin_path),
+            "-m",
+            str(model_path),
+            "--json-input",
+            "-d",
+            str(output_dir),
+            *self._synthesis_args(request),
+        )
+        output_file = output_dir / f"tts-{uuid.uuid4().hex}.wav"
+        payload: dict[str, object] = {"text": request.text, "output_file": str(output_file)}
+        speaker_id = request.speaker_id if request.speaker_id is not None else self._settings.piper_default_speaker_id
+        if speaker_id is not None:
+            payload["speaker_id"] = speaker_id
 
+        process = await self._get_process(command)
+        try:
+            # Waiting in line is bounded too, so a backlog behind one voice turns into 503s instead of piling up.
+            await process.acquire(timeout=self._settings.piper_timeout_seconds)
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self._settings.piper_timeout_seconds,
-                )
-            except TimeoutError as exc:
-                process.kill()
-                raise HTTPException(
-                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
-                    detail="Piper TTS timed out.",
-                ) from exc
-
-            if process.returncode != 0:
-                stderr_text = (stderr or b"").decode("utf-8", errors="ignore").strip()
-                stdout_text = (stdout or b"").decode("utf-8", errors="ignore").strip()
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail=f"Piper failed ({process.returncode}). {stderr_text or stdout_text or 'No error output.'}",
-                )
-
-            if not output_file.exists():
+                await process.synthesize(payload, timeout=self._settings.piper_timeout_seconds)
+            finally:
+                process.lock.release()
+            if not await _wait_for_complete_wav(output_file):
                 raise HTTPException(
                     status_code=status.HTTP_502_BAD_GATEWAY,
                     detail="Piper completed without producing output audio.",
                 )
+        except BaseException:
+            output_file.unlink(missing_ok=True)
+            raise
+        finally:
+            await self._release_process(command, process)
+        return output_file
+
+    def _prepare_output_dir(self) -> Path:
+        configured = self._settings.piper_output_dir
+        if configured is None:
+            # Piper hands each WAV over through a file; keep it in RAM when a tmpfs is available and can be made private.
+            shm_dir = Path("/dev/shm")
+            if hasattr(os, "getuid") and shm_dir.is_dir():
+                candidate = shm_dir / f"controledu-piper-{os.getuid()}"
+                if _make_private_dir(candidate):
+                    self._output_dir = candidate
+                    return candidate
+                logger.warning("Cannot use %s for Piper output; falling back to the temp directory.", candidate)
+            configured = self._settings.temp_dir / "piper"
+        try:
+            configured.mkdir(parents=True, exist_ok=True)
+        except OSError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Cannot create Piper output directory {configured}: {exc}",
+            ) from exc
+        self._output_dir = configured
+        return configured
+
+    def _synthesis_args(self, request: TtsSynthesizeRequest) -> tuple[str, ...]:
+        # Fixed per process; the speaker is the only per-utterance setting Piper reads from JSON input.
+        if (
+            request.length_scale is None
+            and request.noise_scale is None
+            and request.noise_w is None
+            and request.sentence_silence is None
+        ):
+            return self._default_synthesis_args
+
+        settings = self._settings
+        return _build_synthesis_args(
+            request.length_scale if request.length_scale is not None else settings.piper_default_length_scale,
+            request.noise_scale if request.noise_scale is not None else settings.piper_default_noise_scale,
+            request.noise_w if request.noise_w is not None else settings.piper_default_noise_w,
+            request.sentence_silence if request.sentence_silence is not None else settings.piper_default_sentence_silence,
+        )
 
-            return output_file.read_bytes()
+    async def _get_process(self, command: tuple[str, ...]) -> _PiperProcess:
+        # The caller is counted before anything can yield, and must hand the process back via `_release_process`.
+        process = self._processes.get(command)
+        if process is not None:
+            self._processes.move_to_end(command)
+            process.users += 1
+            return process
+
+        process = _PiperProcess(command)
+        process.users += 1
+        self._processes[command] = process
+        await self._retire_unused_processes()
+        return process
+
+    async def _release_process(self, command: tuple[str, ...], process: _PiperProcess) -> None:
+        process.users -= 1
+        if process.users:
+            return
+        if self._processes.get(command) is not process:
+            # Dropped while in use (e.g. by `close`); its last user shuts it down rather than leaking it.
+            await process.close()
+        else:
+            await self._retire_unused_processes()
+
+    async def _retire_unused_processes(self) -> None:
+        # Every process holds its own copy of a voice model; retire the least recently used unused ones.
+        limit = max(1, self._settings.piper_max_processes)
+        for key, candidate in list(self._processes.items()):
+            if len(self._processes) <= limit:
+                break
+            if candidate.users == 0:
+                del self._processes[key]
+                await candidate.close()
+
+    async def close(self) -> None:
+        processes = list(self._processes.values())
+        self._processes.clear()
+        for process in processes:
+            await process.close()
 
     def list_voices(self) -> list[str]:
-        if not self._settings.piper_models_dir.exists():
+        models_dir = self._settings.piper_models_dir
+        try:
+            dir_mtime_ns = os.stat(models_dir).st_mtime_ns
+        except FileNotFoundError:
             return []
-        return sorted(
-            path.stem
-            for path in self._settings.piper_models_dir.glob("*.onnx")
-            if path.is_file()
-        )
+        # Adding, removing or renaming a voice bumps the directory mtime.
+        cached = self._voices_cache
+        if cached is not None and cached[0] == dir_mtime_ns:
+            return list(cached[1])
+
+        # DirEntry.is_file() uses the type from the directory listing, so regular files need no extra stat.
+        with os.scandir(models_dir) as entries:
+            voices = sorted(
+                entry.name[: -len(".onnx")]
+                for entry in entries
+                if entry.name.endswith(".onnx") and entry.is_file()
+            )
+        self._voices_cache = (dir_mtime_ns, voices)
+        return list(voices)
 
     def validate_environment(self) -> list[str]:
         issues: list[str] = []
         if not self._settings.tts_enabled:
             return issues
-        if not self._settings.piper_bin_path.exists():
+        if not self._piper_bin_exists():
             issues.append(f"Piper binary missing: {self._settings.piper_bin_path}")
         if shutil.which("ffmpeg") is None:
             # TTS itself does not require ffmpeg, but STT endpoint often will.
             issues.append("ffmpeg not found in PATH (recommended for STT audio decoding).")
         try:
-            default_model_path = self._resolve_model_path(self._settings.piper_default_voice)
+            _, default_model_exists = self._lookup_model(self._settings.piper_default_voice)
         except ValueError as exc:
             issues.append(f"Invalid PIPER_DEFAULT_VOICE: {exc}")
-            default_model_path = None
-        if default_model_path is not None and not default_model_path.exists():
+            default_model_exists = True
+        if not default_model_exists:
             issues.append(
                 f"Default Piper voice model missing: {self._settings.piper_default_voice}.onnx in {self._settings.piper_models_dir}"
             )
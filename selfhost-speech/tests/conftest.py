@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Lets plain `pytest`, run from the repo root, selfhost-speech/ or tests/, import the service package as `app`.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import security
+from app.security import require_ip_allowlist
+
+
+def _allowed(allowlist: list[str], host: str) -> bool:
+    dependency = require_ip_allowlist(SimpleNamespace(ip_allowlist=allowlist))
+    try:
+        asyncio.run(dependency(SimpleNamespace(client=SimpleNamespace(host=host))))
+    except HTTPException:
+        return False
+    return True
+
+
+@pytest.fixture(params=["pytricia", "fallback"])
+def matcher(request, monkeypatch):
+    if request.param == "pytricia":
+        pytest.importorskip("pytricia")
+    else:
+        monkeypatch.setattr(security, "pytricia", None)
+    return request.param
+
+
+@pytest.mark.parametrize(
+    ("allowlist", "host", "expected"),
+    [
+        (["45.67.89.10", "10.0.0.0/8"], "45.67.89.10", True),
+        (["45.67.89.10", "10.0.0.0/8"], "10.20.30.40", True),
+        (["45.67.89.10", "10.0.0.0/8"], "11.0.0.1", False),
+        # IPv6 addresses whose leading bits equal an allowlisted IPv4 prefix must not match it.
+        (["45.67.89.10", "10.0.0.0/8"], "2d43:590a::1", False),
+        (["45.67.89.10", "10.0.0.0/8"], "a00::5", False),
+        (["45.67.89.10", "10.0.0.0/8"], "::ffff:10.0.0.1", False),
+        (["0.0.0.0/0"], "fd00::1", False),
+        (["::/0"], "10.0.0.1", False),
+        (["fd00::/8", "::1"], "fd12::3", True),
+        (["fd00::/8", "::1"], "::1", True),
+        (["fd00::/8", "::1"], "fe80::1", False),
+    ],
+)
+def test_ip_allowlist_keeps_address_families_apart(matcher, allowlist, host, expected):
+    assert _allowed(allowlist, host) is expected
+
+
+def test_ip_allowlist_rejects_unparseable_hosts(matcher):
+    assert not _allowed(["10.0.0.0/8"], "testclient")